@@ -0,0 +1,86 @@
+﻿#!/usr/bin/env python3
+import sys
+import os
+import time
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from src import driver
+from src import optimize
+from src import pybackend
+from src import vm
+
+# Loop-heavy programs in the shape of the while(x < 10) sample in test.py.
+program = """
+function count(int n) -> int
+{
+    decl(int) x := 0;
+    while(x < n)
+    {
+        x := x + 1;
+    }
+    return x;
+}
+
+function nested(int n) -> int
+{
+    decl(int) s := 0;
+    decl(int) i := 0;
+    while(i < n)
+    {
+        decl(int) j := 0;
+        while(j < 10)
+        {
+            if(j % 2 == 0)
+            {
+                s := s + i * j;
+            }
+            else
+            {
+                s := s - j;
+            }
+            j := j + 1;
+        }
+        i := i + 1;
+    }
+    return s;
+}
+
+function fib(int n) -> int
+{
+    if(n < 2)
+    {
+        return n;
+    }
+    return fib(n - 1) + fib(n - 2);
+}
+"""
+
+cases = (("count", 100000), ("nested", 10000), ("fib", 18))
+
+def best(func, repeat=3):
+    out = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        out = elapsed if out is None else min(out, elapsed)
+    return out
+
+def main(argv):
+    print("{:>10} {:>10} {:>10} {:>10} {:>10}".format(
+        "function", "opt", "vm s", "python s", "speedup"))
+    for opt in (False, True):
+        functions = driver.compile_source(program)
+        if opt:
+            optimize.optimize(functions)
+        machine = vm.VM(functions)
+        module  = pybackend.Module(functions)
+        for name, arg in cases:
+            assert machine.call(name, arg) == module.call(name, arg)
+            interpreted = best(lambda: machine.call(name, arg))
+            compiled    = best(lambda: module.call(name, arg))
+            print("{:>10} {:>10} {:>10.4f} {:>10.4f} {:>10.2f}".format(
+                name, "-O" if opt else "", interpreted, compiled, interpreted / compiled))
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,54 @@
+﻿#!/usr/bin/env python3
+""" Compares precedence climbing with the shunting-yard expression parser
+it replaced, from a checkout of the last commit that had it:
+
+    git worktree add ../pycompile-reference e7f54b7
+    python -m benchmarks.expression_scaling ../pycompile-reference
+
+See benchmarks.reference.
+"""
+import sys
+import os
+import time
+import random
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from src import parser
+from src import lexer
+from benchmarks import reference
+
+sizes = (10, 100, 10000)
+
+def make_expression(operands):
+    rand = random.Random(operands)
+    operations = list(lexer.operations)
+    out = [str(rand.randint(0, 10))]
+    for _ in range(operands - 1):
+        out.append(rand.choice(operations))
+        out.append(rand.choice(("a", "b", str(rand.randint(0, 10)))))
+    return " ".join(out)
+
+def time_engine(module, data, repeat=3):
+    best = None
+    for _ in range(repeat):
+        tokens = module.TokenState(data)
+        start = time.perf_counter()
+        module.expression(tokens)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def main(argv):
+    if len(argv) != 1:
+        sys.stderr.write(__doc__)
+        return 2
+    old_parser = reference.load(argv[0], "parser")
+    print("{:>10} {:>14} {:>12} {:>14}".format("operands", "shunting-yard", "precedence", "us/operand"))
+    for size in sizes:
+        data = make_expression(size)
+        old = time_engine(old_parser, data)
+        new = time_engine(parser, data)
+        print("{:>10} {:>14.4f} {:>12.4f} {:>14.2f}".format(size, old, new, new * 1e6 / size))
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
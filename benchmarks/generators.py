@@ -0,0 +1,78 @@
+﻿#!/usr/bin/env python3
+""" Synthetic programs of a controllable shape. Every generator takes a size
+and returns source that passes semantic checking, so all of the frontend
+stages can be timed on it. """
+import random
+
+from src import lexer
+
+def expression(rand, operands, names=("a", "b")):
+    operations = list(lexer.operations)
+    out = [rand.choice(names)]
+    for _ in range(operands - 1):
+        out.append(rand.choice(operations))
+        out.append(rand.choice(names + (str(rand.randint(1, 9)),)))
+    return " ".join(out)
+
+def many_functions(size):
+    """ size small functions, each calling the one before it. """
+    rand = random.Random(size)
+    out = ["function f0(int a, int b) -> int\n{\n    return a + b;\n}\n"]
+    for i in range(1, size):
+        out.append("""
+function f{0}(int a, int b) -> int
+{{
+    decl(int) x := {1};
+    if(x < 10)
+    {{
+        return f{2}(x, b);
+    }}
+    return x;
+}}
+""".format(i, expression(rand, 5), i - 1))
+    return "".join(out)
+
+def long_expression(size):
+    """ One return of an expression with size operands. """
+    rand = random.Random(size)
+    return "function f(int a, int b) -> int\n{{\n    return {};\n}}\n".format(expression(rand, size))
+
+def if_chain(size):
+    """ An if followed by size elifs and an else. The parser recurses once
+    per elif, about three Python frames each, so at the default recursion
+    limit of 1000 a chain of a little over 300 raises RecursionError. The
+    suite stops at 100 to stay well clear of that. """
+    out = ["function f(int a) -> int\n{\n    if(a == 0)\n    {\n        return 0;\n    }\n"]
+    for i in range(1, size + 1):
+        out.append("    elif(a == {0})\n    {{\n        return a * {0};\n    }}\n".format(i))
+    out.append("    else\n    {\n        return a;\n    }\n    return a;\n}\n")
+    return "".join(out)
+
+def long_while(size):
+    """ A while loop whose body is size assignments. """
+    rand = random.Random(size)
+    out = ["function f(int a, int b) -> int\n{\n    while(a < 100)\n    {\n"]
+    for _ in range(size):
+        out.append("        {} := {};\n".format(rand.choice("ab"), expression(rand, 4)))
+    out.append("    }\n    return a;\n}\n")
+    return "".join(out)
+
+def many_decls(size):
+    """ size declarations, each reading the ones before it. """
+    rand = random.Random(size)
+    out = ["function f(int a) -> int\n{\n    decl(int) v0 := a;\n"]
+    for i in range(1, size):
+        names = ("a", "v{}".format(rand.randrange(i)), "v{}".format(i - 1))
+        out.append("    decl(int) v{} := {};\n".format(i, expression(rand, 3, names)))
+    out.append("    return v{};\n}}\n".format(size - 1))
+    return "".join(out)
+
+# Each shape with the sizes the suite runs it at. if_chain is capped at 100,
+# see its docstring.
+shapes = {
+    "functions"  : (many_functions,  (10, 100, 1000)),
+    "expression" : (long_expression, (10, 100, 1000, 10000)),
+    "if_chain"   : (if_chain,        (10, 50, 100)),
+    "while"      : (long_while,      (10, 100, 1000)),
+    "decls"      : (many_decls,      (10, 100, 1000)),
+}
@@ -0,0 +1,45 @@
+﻿#!/usr/bin/env python3
+import sys
+import os
+import time
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from src import parser
+from src import incremental
+
+unit = """
+function f{0}(int a, int b) -> int
+{{
+    decl(int) x := a * 10 + b % 3;
+    while(x > 10)
+    {{
+        x := x - 1;
+    }}
+    return x + a * b;
+}}
+"""
+
+sizes = (10, 100, 1000)
+
+def best(func, repeat=3):
+    out = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        out = elapsed if out is None else min(out, elapsed)
+    return out
+
+def main(argv):
+    print("{:>10} {:>10} {:>10} {:>10}".format("functions", "full s", "edit s", "speedup"))
+    for size in sizes:
+        text = "".join(unit.format(i) for i in range(size))
+        result = incremental.parse(text)
+        # Edit the middle function's loop body, as a keystroke would.
+        offset = text.index("x - 1", result.spans[size // 2][0])
+        full = best(lambda: parser.parse(text[:offset] + "x - 2" + text[offset + 5:]))
+        edit = best(lambda: result.edit(offset, 5, "x - 2"))
+        print("{:>10} {:>10.4f} {:>10.4f} {:>10.1f}".format(size, full, edit, full / edit))
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,60 @@
+﻿#!/usr/bin/env python3
+import sys
+import os
+import time
+import pickle
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from src import driver
+from src import irformat
+
+unit = """
+function f{0}(int a, int b) -> int
+{{
+    decl(int) x := a * 10 + b % 3;
+    if(x < 10)
+    {{
+        return x;
+    }}
+    while(x > 10)
+    {{
+        x := x - 1;
+    }}
+    return x + a * b;
+}}
+"""
+
+sizes = (10, 100, 1000)
+
+def best(func, repeat=3):
+    out = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        out = elapsed if out is None else min(out, elapsed)
+    return out
+
+def main(argv):
+    print("{:>10} {:>8} {:>10} {:>10} {:>10} {:>10} {:>10}".format(
+        "functions", "format", "bytes", "dump s", "load s", "load 1 s", "ratio"))
+    for size in sizes:
+        functions = driver.compile_source("".join(unit.format(i) for i in range(size)))
+        pickled = pickle.dumps(functions, protocol=pickle.HIGHEST_PROTOCOL)
+        packed  = irformat.dumps(functions)
+        rows = (
+            ("pickle", pickled,
+                lambda: pickle.dumps(functions, protocol=pickle.HIGHEST_PROTOCOL),
+                lambda: pickle.loads(pickled),
+                lambda: pickle.loads(pickled)[0]),
+            ("ir", packed,
+                lambda: irformat.dumps(functions),
+                lambda: irformat.loads(packed),
+                lambda: irformat.Reader(packed)[0]),
+        )
+        for name, data, dump, load, load_one in rows:
+            print("{:>10} {:>8} {:>10} {:>10.4f} {:>10.4f} {:>10.4f} {:>10.2f}".format(
+                size, name, len(data), best(dump), best(load), best(load_one), len(data) / len(packed)))
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,36 @@
+﻿#!/usr/bin/env python3
+import sys
+import os
+import time
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from src import driver
+from src import lazy
+from src import lexer
+from benchmarks.irformat_size import unit
+
+sizes = (10, 100, 1000, 5000)
+
+def best(func, repeat=3):
+    out = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        out = elapsed if out is None else min(out, elapsed)
+    return out
+
+def lazy_call(text):
+    lazy.Module(text).vm().call("f0", 1, 2)
+
+def main(argv):
+    print("{:>10} {:>10} {:>10} {:>10} {:>10}".format("functions", "lex s", "eager s", "lazy s", "speedup"))
+    for size in sizes:
+        text = "".join(unit.format(i) for i in range(size))
+        lexing = best(lambda: lexer.TokenBuffer(text))
+        eager  = best(lambda: driver.compile_source(text))
+        start  = best(lambda: lazy_call(text))
+        print("{:>10} {:>10.4f} {:>10.4f} {:>10.4f} {:>10.1f}".format(size, lexing, eager, start, eager / start))
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,47 @@
+﻿#!/usr/bin/env python3
+import sys
+import os
+import time
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from src import lexer
+
+unit = """
+function add(int a, int b) -> int
+{
+    decl(int) x := a * 10 + b % 3;
+    while(x >= 10)
+    {
+        x := x - 1;
+    }
+    return x;
+}
+"""
+
+sizes = (
+    1 << 10,
+    10 << 10,
+    100 << 10,
+    1 << 20,
+    10 << 20,
+)
+
+def make_source(size):
+    return unit * (size // len(unit) + 1)
+
+def time_lex(data):
+    start = time.perf_counter()
+    count = 0
+    for _ in lexer.lex(data):
+        count += 1
+    return time.perf_counter() - start, count
+
+def main(argv):
+    print("{:>12} {:>10} {:>10} {:>12}".format("bytes", "tokens", "seconds", "us/KB"))
+    for size in sizes:
+        data = make_source(size)
+        elapsed, count = time_lex(data)
+        print("{:>12} {:>10} {:>10.4f} {:>12.2f}".format(len(data), count, elapsed, elapsed * 1e6 / (len(data) / 1024)))
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,71 @@
+﻿#!/usr/bin/env python3
+""" Compares this parser with the exception-based one it replaced, from a
+checkout of the last commit that had it:
+
+    git worktree add ../pycompile-reference e7f54b7
+    python -m benchmarks.parser_engines ../pycompile-reference
+
+See benchmarks.reference.
+"""
+import sys
+import os
+import time
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from src import parser
+from benchmarks import reference
+
+unit = """
+function f{0}(int a, int b) -> int
+{{
+    decl(int) x := a * 10 + b % 3;
+    x := f{0}(x, b);
+    if(x < 10)
+    {{
+        return x;
+    }}
+    elif(x > 20)
+    {{
+        x := x - 1;
+    }}
+    else
+    {{
+        g(x);
+    }}
+    while(x > 10)
+    {{
+        x := x - 1;
+    }}
+    return x;
+}}
+"""
+
+sizes = (10, 100, 1000)
+
+def make_source(count):
+    return "".join(unit.format(i) for i in range(count))
+
+def time_engine(module, data, repeat=3):
+    best = None
+    for _ in range(repeat):
+        tokens = module.TokenState(data)
+        start = time.perf_counter()
+        module.function_list(tokens)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def main(argv):
+    if len(argv) != 1:
+        sys.stderr.write(__doc__)
+        return 2
+    old_parser = reference.load(argv[0], "parser")
+    print("{:>10} {:>12} {:>12} {:>8}".format("functions", "reference", "current", "speedup"))
+    for size in sizes:
+        data = make_source(size)
+        old = time_engine(old_parser, data)
+        new = time_engine(parser, data)
+        print("{:>10} {:>12.4f} {:>12.4f} {:>7.2f}x".format(size, old, new, old / new))
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,28 @@
+﻿#!/usr/bin/env python3
+""" Loads the compiler from another checkout to benchmark against, such as
+a git worktree of an earlier commit:
+
+    git worktree add ../pycompile-reference <commit>
+    python -m benchmarks.parser_engines ../pycompile-reference
+    git worktree remove ../pycompile-reference
+
+Its src package is imported as `reference`, next to this tree's src.
+"""
+import sys
+import os
+import importlib
+import importlib.util
+
+def load(tree, module):
+    """ Returns module, such as "parser", from the src package of the
+    checkout at tree. """
+    if "reference" not in sys.modules:
+        path = os.path.join(os.path.abspath(tree), "src")
+        if not os.path.isfile(os.path.join(path, "__init__.py")):
+            raise FileNotFoundError("No src package in {}".format(tree))
+        spec = importlib.util.spec_from_file_location("reference",
+            os.path.join(path, "__init__.py"), submodule_search_locations=[path])
+        package = importlib.util.module_from_spec(spec)
+        sys.modules["reference"] = package
+        spec.loader.exec_module(package)
+    return importlib.import_module("reference." + module)
@@ -0,0 +1,137 @@
+﻿#!/usr/bin/env python3
+""" Times lexing, parsing, semantic checking and IR lowering on the
+synthetic programs in benchmarks.generators.
+
+    python -m benchmarks.suite
+    python -m benchmarks.suite --save-baseline
+    python -m benchmarks.suite --baseline results.json -o new.json
+
+Every run is compared against a baseline, benchmarks/baseline.json unless
+--baseline names another results file, and exits with status 1 if any
+stage got slower by more than --threshold. Stages faster than --min-time in
+the baseline are too noisy to compare and are skipped. Each run also times
+a fixed pure Python loop and the baseline is scaled by how much faster or
+slower that ran, so a baseline stays roughly comparable on another
+machine. --save-baseline
+writes the run as the new baseline instead; do that after an intended
+change in speed, or when the scaled comparison drifts on a new machine.
+"""
+import sys
+import os
+import time
+import json
+import argparse
+import platform
+from collections import OrderedDict
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+import src
+from src import driver
+from src import stats
+from benchmarks import generators
+
+stages = ("lex", "parse", "check", "lower")
+
+default_baseline = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+def time_stages(text, repeat):
+    """ Returns the best time of each stage over `repeat` compiles. """
+    best = OrderedDict()
+    for _ in range(repeat):
+        with stats.collect() as collected:
+            driver.compile_source(text)
+        for stage in stages:
+            elapsed = collected.times[stage]
+            best[stage] = min(best.get(stage, elapsed), elapsed)
+    return best
+
+def calibrate(repeat):
+    """ Returns the best time of a fixed pure Python workload, a measure of
+    the speed of the machine and interpreter. """
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        total = 0
+        for i in range(200000):
+            total += i * i % 7
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def run(shapes=None, repeat=3, log=None):
+    results = OrderedDict()
+    for name, (generate, sizes) in generators.shapes.items():
+        if shapes and name not in shapes:
+            continue
+        results[name] = OrderedDict()
+        for size in sizes:
+            times = time_stages(generate(size), repeat)
+            results[name][str(size)] = times
+            if log:
+                log("{:>12} {:>8} {}".format(name, size, " ".join(
+                    "{} {:.4f}".format(x, y) for x, y in times.items())))
+    return OrderedDict((
+        ("version",     src.__version__),
+        ("python",      platform.python_version()),
+        ("repeat",      repeat),
+        ("calibration", calibrate(repeat)),
+        ("results",     results),
+    ))
+
+def compare(baseline, current, threshold=0.25, min_time=1e-3):
+    """ Returns (shape, size, stage, old, new) for every stage of current
+    that is more than `threshold` slower than in baseline, with old scaled
+    by the calibrations of the two runs if both have one. """
+    scale = 1
+    if baseline.get("calibration") and current.get("calibration"):
+        scale = current["calibration"] / baseline["calibration"]
+    out = []
+    for name, sizes in current["results"].items():
+        for size, times in sizes.items():
+            old_times = baseline["results"].get(name, {}).get(size, {})
+            for stage, new in times.items():
+                old = old_times.get(stage)
+                if old is None or old < min_time:
+                    continue
+                old *= scale
+                if new > old * (1 + threshold):
+                    out.append((name, size, stage, old, new))
+    return out
+
+def main(argv):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-o", "--output", default=None, help="write the results as JSON")
+    parser.add_argument("--baseline", default=default_baseline, help="results JSON to compare against, %(default)s by default")
+    parser.add_argument("--save-baseline", action="store_true", help="write the results to the baseline instead of comparing")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed slowdown, 0.25 is 25%%")
+    parser.add_argument("--min-time", type=float, default=1e-3, help="skip baseline stages faster than this many seconds")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("shapes", nargs="*", help="shapes to run, all by default: " + ", ".join(generators.shapes))
+    args = parser.parse_args(argv)
+
+    current = run(args.shapes, args.repeat, log=print)
+    if args.output:
+        with open(args.output, "w") as fp:
+            json.dump(current, fp, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, "w") as fp:
+            json.dump(current, fp, indent=2)
+            fp.write("\n")
+        print("saved baseline {}".format(args.baseline))
+        return 0
+    try:
+        with open(args.baseline) as fp:
+            baseline = json.load(fp)
+    except FileNotFoundError:
+        print("no baseline at {}, run with --save-baseline to record one".format(args.baseline))
+        return 1
+    regressions = compare(baseline, current, args.threshold, args.min_time)
+    for name, size, stage, old, new in regressions:
+        print("regression: {} {} {}: {:.4f} -> {:.4f} ({:+.0%})".format(name, size, stage, old, new, new / old - 1))
+    if regressions:
+        return 1
+    print("no regressions over {:.0%}".format(args.threshold))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
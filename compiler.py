@@ -1,13 +1,49 @@
 ﻿#!/usr/bin/env python3
 import sys
+import json
 import argparse
-from src import *
+from collections import OrderedDict
+from src import driver
+from src import stats
 
 def main(argv):
     parser = argparse.ArgumentParser()
     parser.add_argument("-o", "--output", default=None)
+    parser.add_argument("-j", "--jobs", type=int, default=1)
+    parser.add_argument("--cache-dir", default=None)
+    parser.add_argument("--cache-size", type=int, default=256, help="cache size limit in MB")
+    parser.add_argument("-O", "--optimize", action="store_true")
+    parser.add_argument("--opt-report", action="store_true", help="print instruction counts before and after -O")
+    parser.add_argument("--stats", choices=["json"], default=None, help="write compiler statistics to stderr")
     parser.add_argument("inputs", nargs="+")
     args = parser.parse_args(argv)
 
+    results = driver.compile_files(args.inputs, args.jobs,
+        cache_dir=args.cache_dir, cache_size=args.cache_size << 20, optimize=args.optimize,
+        stats=args.stats is not None)
+    failed = False
+    out = open(args.output, "w") if args.output else sys.stdout
+    try:
+        for result in results:
+            if result.error is not None:
+                sys.stderr.write("{}: {}\n".format(result.path, result.error))
+                failed = True
+            else:
+                out.write(result.output)
+                if args.opt_report and result.reports is not None:
+                    for report in result.reports:
+                        sys.stderr.write("{}: {}\n".format(result.path, report))
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    if args.stats == "json":
+        total = stats.Stats()
+        files = OrderedDict()
+        for result in results:
+            total.merge(result.stats)
+            files[result.path] = result.stats.as_dict()
+        sys.stderr.write(json.dumps(OrderedDict((("total", total.as_dict()), ("files", files))), indent=2) + "\n")
+    return 1 if failed else 0
+
 if __name__ == "__main__":
-    main(sys.argv[1:])
\ No newline at end of file
+    sys.exit(main(sys.argv[1:]))
\ No newline at end of file
@@ -1,87 +1,256 @@
 ﻿#!/usr/bin/env python3
-from collections import namedtuple
+from collections import namedtuple, OrderedDict
 from .           import intermediate
+from .           import stats
 from contextlib  import contextmanager
-import functools
-
-def semanticsfunc(func):
-    @functools.wraps(func)
-    def out(self, table = SymbolTable()):
-        self.symbol_table = table
-        out = func(self, table)
-        return out
-    return out
+from types       import GeneratorType
 
 class SemanticsException(Exception):
     pass
 
-class SymbolTable(dict):
-    def __init__(self, parent=None):
+class UnresolvedNames(SemanticsException):
+    def __init__(self, names):
+        self.names = names
+        if len(names) == 1:
+            msg = "Cannot find variable '{}'".format(names[0])
+        else:
+            msg = "Cannot find variables {}".format(", ".join("'{}'".format(x) for x in names))
+        super().__init__(msg)
+
+    def __reduce__(self):
+        return (type(self), (self.names,))
+
+Binding = namedtuple("Binding", ["scope", "slot", "value"])
+
+def symbol(key):
+    """ Returns the name a SymbolTable stores key under: key itself for a
+    str, otherwise the (interned) value of an Identifier. """
+    return key if type(key) is str else key.value
+
+class Resolutions(list):
+    """ Side table of what the names in one function resolved to.
+
+    Holds a (name, scope depth, slot index) for each use site, in the order
+    checking reaches them, which is the order lowering does, or None for a
+    name that did not resolve. Identifiers are shared within a parse, so
+    this is kept off the tree. `renamed` maps the bindings that shadow
+    another variable of the function to the distinct name lowering gives
+    them.
+    """
+    def __init__(self):
         super().__init__()
+        self.renamed = {}
+
+class SymbolTable(object):
+    """ Flat symbol table shared by a scope and all of its sub-scopes.
+
+    Every name maps to a stack of bindings, innermost last, so a lookup is a
+    single dict access whatever the nesting depth. new_scope() returns a
+    scope one level deeper over the same dict and close() pops its bindings
+    again. Names that cannot be found are collected in `unresolved` and
+    reported together by AST.check_semantics.
+
+    A binding's slot is its index among its scope's names. While a function
+    is checked `sites` is its Resolutions, which `use` appends to, and
+    `resolutions` maps every checked Function to its own.
+    """
+    def __init__(self, parent=None):
+        if parent is None:
+            self.bindings    = {}
+            self.unresolved  = []
+            self.resolutions = {}
+            self.sites       = None
+            self.depth       = 0
+        else:
+            self.bindings    = parent.bindings
+            self.unresolved  = parent.unresolved
+            self.resolutions = parent.resolutions
+            self.sites       = parent.sites
+            self.depth       = parent.depth + 1
         self.parent = parent
+        self.names  = []
 
     def __setitem__(self, key, value):
-        if key in self:
+        key = symbol(key)
+        stack = self.bindings.setdefault(key, [])
+        if stack and stack[-1].scope is self:
             raise SemanticsException("Trying to insert existing identifier '{}' into scope.".format(key))
-        return super().__setitem__(str(key), value)
+        slot = len(self.names)
+        if self.sites is not None:
+            # Depth 0 holds the functions, anything deeper is a variable.
+            for binding in stack:
+                if 1 <= binding.scope.depth <= self.depth:
+                    self.sites.renamed[(key, self.depth, slot)] = Identifier(
+                        "_s{}_{}_{}".format(self.depth, slot, key))
+                    break
+        stack.append(Binding(self, slot, value))
+        self.names.append(key)
+
+    def lookup(self, key):
+        collected = stats.current()
+        if collected is not None:
+            collected.counts["symbol_lookups"] += 1
+        for binding in reversed(self.bindings.get(symbol(key), ())):
+            if binding.scope.depth <= self.depth:
+                return binding
+        return None
 
     def __getitem__(self, y):
-        try:
-            return super().__getitem__(str(y))
-        except KeyError as e:
-            if self.parent is not None:
-                return self.parent[str(y)]
-            raise SemanticsException("Cannot find variable '{}'".format(y)) from e
+        binding = self.lookup(y)
+        if binding is None:
+            self.unresolved.append(symbol(y))
+            return Unresolved("<unresolved>")
+        return binding.value
+
+    def __contains__(self, key):
+        return self.lookup(key) is not None
+
+    def resolve(self, key):
+        """ Returns the (scope depth, slot index) that key refers to. """
+        binding = self.lookup(key)
+        if binding is None:
+            return None
+        return binding.scope.depth, binding.slot
+
+    def record(self, key, binding):
+        """ Records binding as what key resolved to at the next use site of
+        the function being checked. """
+        if self.sites is not None:
+            self.sites.append(None if binding is None else (symbol(key), binding.scope.depth, binding.slot))
+
+    def use(self, key):
+        """ Looks key up as __getitem__ does and records the use site. """
+        binding = self.lookup(key)
+        self.record(key, binding)
+        if binding is None:
+            self.unresolved.append(symbol(key))
+            return Unresolved("<unresolved>")
+        return binding.value
 
     def new_scope(self):
         return SymbolTable(self)
 
+    def close(self):
+        for key in self.names:
+            stack = self.bindings[key]
+            if stack[-1].scope is self:
+                stack.pop()
+            else:
+                stack[:] = [x for x in stack if x.scope is not self]
+        self.names = []
+
+    def raise_unresolved(self):
+        if self.unresolved:
+            names = list(OrderedDict.fromkeys(self.unresolved))
+            del self.unresolved[:]
+            raise UnresolvedNames(names)
+
+class SemanticContext(object):
+    """ The state for checking one compilation unit. check_semantics makes a
+    new one per call unless one is passed in, so nothing is shared between
+    compilations and several can be checked at once. """
+    def __init__(self, table=None):
+        self.table = table if table is not None else SymbolTable()
+
+def walk(node, method, arg):
+    """ Runs the pass `method` over the tree rooted at node without recursion.
+
+    A pass method takes (self, arg) and either returns its result directly or
+    is a generator that yields the child nodes it needs, as `child` or as
+    `(child, arg)` to give the child a different argument, and is sent each
+    child's result back. Suspended generators are kept on an explicit stack,
+    so the depth of the tree is not limited by the recursion limit.
+    """
+    stack = []
+    visits = 1
+    value = getattr(node, method)(arg)
+    while True:
+        if type(value) is GeneratorType:
+            stack.append((value, arg))
+            value = None
+        elif not stack:
+            collected = stats.current()
+            if collected is not None:
+                collected.counts["ast_nodes" + method] += visits
+            return value
+        gen, arg = stack[-1]
+        try:
+            child = gen.send(value)
+        except StopIteration as e:
+            stack.pop()
+            value = e.value
+            continue
+        if type(child) is tuple:
+            child, arg = child
+        visits += 1
+        value = getattr(child, method)(arg)
+
 class AST(object):
+    __slots__ = ()
+
     def to_intermediate(self, state):
+        return walk(self, "_to_intermediate", state)
+
+    def check_semantics(self, context=None):
+        if context is None:
+            context = SemanticContext()
+        elif isinstance(context, SymbolTable):
+            context = SemanticContext(context)
+        out = walk(self, "_check_semantics", context.table)
+        context.table.raise_unresolved()
+        return out
+
+    def _to_intermediate(self, state):
         raise NotImplementedError("For {}".format(self.__class__.__name__))
 
-    @semanticsfunc
-    def check_semantics(self, table = SymbolTable()):
+    def _check_semantics(self, table):
         raise NotImplementedError("For {}".format(self.__class__.__name__))
 
+    def _print(self, out):
+        out.append(str(self))
+
 class Param(AST):
+    __slots__ = ("type", "id")
+
     def __init__(self):
         self.type = None
         self.id   = None
 
-    @semanticsfunc
-    def check_semantics(self, table = SymbolTable()):
-        type_ = self.type.check_semantics(table)
+    def _check_semantics(self, table):
+        type_ = yield self.type
         table[self.id] = type_
         return type_
 
 class Return(AST):
+    __slots__ = ("expr",)
+
     def __init__(self, expr=None):
         self.expr = None
 
-    @semanticsfunc
-    def check_semantics(self, table = SymbolTable()):
+    def _check_semantics(self, table):
         if self.expr is None:
             if table["_return"] is not None:
                 raise SemanticsException("return must be of type {}".format(table["_return"]))
             return None
         if table["_return"] is None:
             raise SemanticsException("Cannot return value from void function")
-        expr_type = self.expr.check_semantics(table)
+        expr_type = yield self.expr
         if not expr_type.convertable_to(table["_return"]):
-            raise SemanticsException("Cannot convert type '{}' to '{}'".format(expr_type, table["_function"]))
+            raise SemanticsException("Cannot convert type '{}' to '{}'".format(expr_type, table["_return"]))
         return table["_return"]
 
-    def to_intermediate(self, state):
+    def _to_intermediate(self, state):
         out = intermediate.InstructionList()
         var = None
         if self.expr is not None:
-            out += self.expr.to_intermediate(state)
+            out += (yield self.expr)
             var = state.last_temp()
         out += intermediate.Return(var)
         return out
 
 class ValueType(AST):
+    __slots__ = ("value",)
+
     def __init__(self, value):
         self.value = value
 
@@ -92,14 +261,15 @@ class ValueType(AST):
         return str(self.value)
 
 class Type(ValueType):
-    @semanticsfunc
-    def check_semantics(self, table = SymbolTable()):
+    __slots__ = ()
+
+    def _check_semantics(self, table):
         if self.value == "int":
             return self
         raise SemanticsException("Type {} is not known".format(self.value))
 
     def convertable_to(self, other):
-        return self.value == other.value
+        return self.value == other.value or isinstance(other, Unresolved)
 
     def supports_operation_with(self, operation, other):
         return True
@@ -109,37 +279,92 @@ class Type(ValueType):
             return self
         raise SemanticsException("Type {} does not support '{}' operation with {}".format(self, operation, other))
 
+class Unresolved(Type):
+    """ The type of a name that could not be found. It converts to and
+    combines with anything so that checking carries on past it. """
+    __slots__ = ()
+
+    def convertable_to(self, other):
+        return True
+
+    def get_result_type(self, operation, other):
+        return self
+
 class Identifier(ValueType):
-    @semanticsfunc
-    def check_semantics(self, table = SymbolTable()):
-        return table[self.value]
+    __slots__ = ()
 
-    def to_intermediate(self, state):
+    def _check_semantics(self, table):
+        return table.use(self)
+
+    def _to_intermediate(self, state):
         out = intermediate.InstructionList()
         #out += intermediate.Assign(state.temp(), self)
-        state.set_last(self)
+        state.set_last(state.variable(self))
         return out
 
 class IntegerLiteral(ValueType):
-    @semanticsfunc
-    def check_semantics(self, table = SymbolTable()):
+    __slots__ = ()
+
+    def _check_semantics(self, table):
         return Type("int")
 
-    def to_intermediate(self, state):
+    def _to_intermediate(self, state):
         out = intermediate.InstructionList()
         #out += intermediate.Assign(state.temp(), self)
         state.set_last(self)
         return out
 
 class Operation(ValueType):
-    pass
+    __slots__ = ()
+
+class Void(Type):
+    """ The type of a call to a function with no return type. """
+    __slots__ = ()
+
+    def convertable_to(self, other):
+        return False
+
+    def supports_operation_with(self, operation, other):
+        return False
 
 class FuncCall(AST):
+    __slots__ = ("id", "exprs")
+
     def __init__(self, id=None, exprs=None):
         self.id = id
         self.exprs = exprs
 
+    def _check_semantics(self, table):
+        func = table[self.id]
+        if isinstance(func, Unresolved):
+            for x in self.exprs:
+                yield x
+            return func
+        if not isinstance(func, Function):
+            raise SemanticsException("'{}' is not a function".format(self.id))
+        if len(self.exprs) != len(func.params):
+            raise SemanticsException("Function '{}' takes {} arguments but {} were given".format(
+                self.id, len(func.params), len(self.exprs)))
+        for expr, param in zip(self.exprs, func.params):
+            expr_type = yield expr
+            if not expr_type.convertable_to(param.type):
+                raise SemanticsException("Cannot pass type '{}' as '{}' to '{}'".format(expr_type, param.type, self.id))
+        if func.return_type is None:
+            return Void("void")
+        return func.return_type
+
+    def _to_intermediate(self, state):
+        out = intermediate.InstructionList()
+        args = []
+        for x in self.exprs:
+            out += (yield x)
+            args.append(state.last_temp())
+        out += intermediate.Call(self.id, state.temp(), args)
+        return out
+
 class Binop(AST):
+    __slots__ = ("lhs", "rhs", "op")
+
     def __init__(self, *, lhs = None, rhs = None, op = None):
         self.lhs = lhs
         self.rhs = rhs
@@ -149,165 +374,199 @@ class Binop(AST):
         return "Binop{}".format(self.print())
 
     def print(self, depth=0):
-        if isinstance(self.lhs, Binop):
-            sl = self.lhs.print()
-        else:
-            sl = str(self.lhs)
-
-        if isinstance(self.rhs, Binop):
-            sr = self.rhs.print()
-        else:
-            sr = str(self.rhs)
-        return "({} {} {})".format(sl, self.op, sr)
-
-    @semanticsfunc
-    def check_semantics(self, table = SymbolTable()):
-        lhs_type = self.lhs.check_semantics(table)
-        rhs_type = self.rhs.check_semantics(table)
+        out = []
+        walk(self, "_print", out)
+        return "".join(out)
+
+    def _print(self, out):
+        out.append("(")
+        yield self.lhs
+        out.append(" {} ".format(self.op))
+        yield self.rhs
+        out.append(")")
+
+    def _check_semantics(self, table):
+        lhs_type = yield self.lhs
+        rhs_type = yield self.rhs
         return lhs_type.get_result_type(self.op, rhs_type)
 
-    def to_intermediate(self, state):
-        out = intermediate.InstructionList()
-        out += self.lhs.to_intermediate(state)
+    def _to_intermediate(self, state):
+        # Extend the left operand's list in place so a left-deep chain of
+        # operators is lowered in linear time.
+        out = yield self.lhs
         t0 = state.last_temp()
-        out += self.rhs.to_intermediate(state)
+        out += (yield self.rhs)
         t1 = state.last_temp()
         out += intermediate.Op(state.temp(), self.op, t0, t1)
         return out
 
 class Function(AST):
+    __slots__ = ("id", "params", "return_type", "statements")
+
     def __init__(self, *, id=None, params=None, return_type=None, statements=None):
         self.id = id
         self.params = params
         self.return_type = return_type
         self.statements = statements
 
-    @semanticsfunc
-    def check_semantics(self, table = SymbolTable()):
-        table[self.id] = self
+    def _check_semantics(self, table):
+        # A FunctionList declares all of its functions before checking them.
+        if table.lookup(self.id) is None:
+            table[self.id] = self
         scope = table.new_scope()
-        self.params.check_semantics(scope)
+        scope.sites = table.resolutions[self] = Resolutions()
+        yield (self.params, scope)
         # Store the return type in a dummy variable
         if self.return_type:
-            scope["_return"] = self.return_type.check_semantics(scope)
+            scope["_return"] = yield (self.return_type, scope)
         else:
             scope["_return"] = None
-        self.statements.check_semantics(scope)
+        yield (self.statements, scope)
+        scope.close()
 
-    def to_intermediate(self, state):
-        out = intermediate.Function(self.id)
+    def _to_intermediate(self, state):
+        out = intermediate.Function(self.id, [x.id for x in self.params], self.return_type)
+        state.begin(state.resolutions.get(self))
         for stmt in self.statements:
-            out.instructions += stmt.to_intermediate(state)
+            out.instructions += (yield stmt)
+        state.begin(None)
         return out
 
 class Assign(AST):
+    __slots__ = ("lhs", "rhs")
+
     def __init__(self, lhs=None, rhs=None):
         self.lhs = lhs
         self.rhs = rhs
 
-    @semanticsfunc
-    def check_semantics(self, table = SymbolTable()):
-        lhs_type = self.lhs.check_semantics(table)
-        rhs_type = self.rhs.check_semantics(table)
+    def _check_semantics(self, table):
+        lhs_type = yield self.lhs
+        rhs_type = yield self.rhs
         if rhs_type.convertable_to(lhs_type):
             return lhs_type
         raise SemanticsException("Cannot assign type '{}' to type '{}'".format(rhs_type, lhs_type))
 
-    def to_intermediate(self, state):
-        out = intermediate.InstructionList()
-        out += self.rhs.to_intermediate(state)
-        out += intermediate.Assign(self.lhs, state.last_temp())
+    def _to_intermediate(self, state):
+        # Checking reaches lhs first, so its use site comes first.
+        lhs = state.variable(self.lhs)
+        out = yield self.rhs
+        out += intermediate.Assign(lhs, state.last_temp())
         return out
 
 class Declare(AST):
+    __slots__ = ("type_", "id", "initial_value")
+
     def __init__(self, type_=None, id=None, initial_value=None):
         self.type_ = type_
         self.id    = id
         self.initial_value = initial_value
 
-    @semanticsfunc
-    def check_semantics(self, table = SymbolTable()):
-        init_type = self.initial_value.check_semantics(table)
-        decl_type = self.type_.check_semantics(table)
+    def _check_semantics(self, table):
+        init_type = yield self.initial_value
+        decl_type = yield self.type_
         if init_type.convertable_to(decl_type):
             table[self.id] = decl_type
+        table.record(self.id, table.lookup(self.id))
 
-    def to_intermediate(self, state):
-        out = self.initial_value.to_intermediate(state)
-        out += intermediate.Assign(self.id, state.last_temp())
+    def _to_intermediate(self, state):
+        out = yield self.initial_value
+        out += intermediate.Assign(state.variable(self.id), state.last_temp())
         return out
 
 class If(AST):
+    __slots__ = ("cond", "true_branch", "false_branch")
+
     def __init__(self, cond=None, true_branch=None, false_branch=None):
         self.cond = cond
         self.true_branch = true_branch
         self.false_branch = false_branch
 
-    @semanticsfunc
-    def check_semantics(self, table = SymbolTable()):
-        cond_type = self.cond.check_semantics(table)
-        self.true_branch.check_semantics(table.new_scope())
+    def _check_semantics(self, table):
+        cond_type = yield self.cond
+        scope = table.new_scope()
+        yield (self.true_branch, scope)
+        scope.close()
         if self.false_branch is not None:
-            self.false_branch.check_semantics(table.new_scope())
+            scope = table.new_scope()
+            yield (self.false_branch, scope)
+            scope.close()
 
-    def to_intermediate(self, state):
+    def _to_intermediate(self, state):
         l0 = state.label()
         l1 = state.label()
-        out =  self.cond.to_intermediate(state)
+        out = yield self.cond
         out += intermediate.JmpNotIf(l0, state.last_temp())
-        out += self.true_branch.to_intermediate(state)
+        out += (yield self.true_branch)
         out += intermediate.Jmp(l1)
         out += l0
         if self.false_branch is not None:
-            out += self.false_branch.to_intermediate(state)
+            out += (yield self.false_branch)
         out += l1
         return out
         
 
 class While(AST):
+    __slots__ = ("cond", "statements")
+
     def __init__(self, cond=None, statements=None):
         self.cond = cond
         self.statements = statements
 
-    @semanticsfunc
-    def check_semantics(self, table = SymbolTable()):
-        cond_type = self.cond.check_semantics(table)
-        self.statements.check_semantics(table.new_scope())
+    def _check_semantics(self, table):
+        cond_type = yield self.cond
+        scope = table.new_scope()
+        yield (self.statements, scope)
+        scope.close()
 
-    def to_intermediate(self, state):
+    def _to_intermediate(self, state):
         l0 = state.label()
         l1 = state.label()
         out = intermediate.InstructionList()
         out += l0
-        out += self.cond.to_intermediate(state)
+        out += (yield self.cond)
         out += intermediate.JmpNotIf(l1, state.last_temp())
-        out += self.statements.to_intermediate(state)
+        out += (yield self.statements)
         out += intermediate.Jmp(l0)
         out += l1
         return out
 
 class ASTList(AST, list):
-    @semanticsfunc
-    def check_semantics(self, table = SymbolTable()):
+    __slots__ = ()
+
+    def _check_semantics(self, table):
         for x in self:
-            x.check_semantics(table)
+            yield x
 
 class FunctionList(ASTList):
-    def to_intermediate(self, state):
+    __slots__ = ()
+
+    def _check_semantics(self, table):
+        # Signatures first, so that a body can call any function in the
+        # list, then the bodies, which only depend on the signatures.
+        for x in self:
+            table[x.id] = x
+        for x in self:
+            yield x
+
+    def _to_intermediate(self, state):
         out = intermediate.FunctionList()
         for x in self:
-            out.append(x.to_intermediate(state))
+            local = intermediate.TransformState(state.resolutions)
+            out.append((yield (x, local)))
+            state.merge(local.temps, local.labels)
         return out
 
 class StatementList(ASTList):
-    def to_intermediate(self, state):
+    __slots__ = ()
+
+    def _to_intermediate(self, state):
         out = intermediate.InstructionList()
         for stmt in self:
-            out += stmt.to_intermediate(state)
+            out += (yield stmt)
         return out
 
 class ExpressionList(ASTList):
-    pass
+    __slots__ = ()
 
 class FunctionParams(ASTList):
-    pass
\ No newline at end of file
+    __slots__ = ()
\ No newline at end of file
@@ -0,0 +1,121 @@
+﻿#!/usr/bin/env python3
+import os
+import hashlib
+import tempfile
+from . import irformat
+
+DEFAULT_SIZE = 256 << 20
+
+_version = None
+
+def version():
+    """ Identifies the compiler that wrote an entry: a hash of the compiler
+    sources and the IR format version, so that any change to the frontend
+    invalidates the entries it made. """
+    global _version
+    if _version is None:
+        h = hashlib.sha256("irformat {}".format(irformat.VERSION).encode("ascii"))
+        root = os.path.dirname(os.path.abspath(__file__))
+        for name in sorted(os.listdir(root)):
+            if name.endswith(".py"):
+                with open(os.path.join(root, name), "rb") as fp:
+                    h.update(b"\0" + name.encode("utf-8") + b"\0")
+                    h.update(fp.read())
+        _version = h.hexdigest()
+    return _version
+
+class CompileCache(object):
+    """ On-disk cache of compiled intermediate.FunctionLists, stored in the
+    irformat binary format.
+
+    Entries are keyed by a hash of the compiler version and the source bytes,
+    so an unchanged file skips the whole frontend. Reading an entry touches
+    its mtime. The size of the directory is read once when the cache is
+    opened and then kept up to date by put(); once it grows past max_size
+    the oldest entries are removed until it is back under low_water times
+    max_size, so the directory is not scanned again on the next few puts.
+    """
+    suffix = ".ir"
+    low_water = 0.75
+
+    def __init__(self, path, max_size = DEFAULT_SIZE):
+        self.path     = path
+        self.max_size = max_size
+        self.hits     = 0
+        self.misses   = 0
+        os.makedirs(path, exist_ok=True)
+        self.size     = sum(x[1] for x in self.entries())
+
+    def key(self, data):
+        h = hashlib.sha256(version().encode("ascii"))
+        h.update(b"\0")
+        h.update(data)
+        return h.hexdigest()
+
+    def entry(self, key):
+        return os.path.join(self.path, key + self.suffix)
+
+    def entries(self):
+        """ Returns (mtime, size, path) of every entry, oldest first. """
+        out = []
+        for x in os.scandir(self.path):
+            if not x.name.endswith(self.suffix):
+                continue
+            try:
+                stat = x.stat()
+            except FileNotFoundError:
+                continue
+            out.append((stat.st_mtime, stat.st_size, x.path))
+        out.sort()
+        return out
+
+    def get(self, key):
+        path = self.entry(key)
+        try:
+            with open(path, "rb") as fp:
+                out = irformat.loads(fp.read())
+            os.utime(path)
+        except (OSError, irformat.FormatError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return out
+
+    def put(self, key, functions):
+        data = irformat.dumps(functions)
+        path = self.entry(key)
+        try:
+            replaced = os.path.getsize(path)
+        except OSError:
+            replaced = 0
+        fd, temp = tempfile.mkstemp(dir=self.path, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as fp:
+                fp.write(data)
+            os.replace(temp, path)
+        except BaseException:
+            os.unlink(temp)
+            raise
+        self.size += len(data) - replaced
+        if self.size > self.max_size:
+            self.evict(keep=path)
+
+    def evict(self, keep=None):
+        """ Removes the oldest entries, other than the path `keep`, until the
+        directory is under low_water * max_size. Rescans the directory, so
+        entries written by other processes are counted too. """
+        entries = self.entries()
+        total = sum(x[1] for x in entries)
+        if total > self.max_size:
+            target = self.max_size * self.low_water
+            for _, size, path in entries:
+                if total <= target:
+                    break
+                if path == keep:
+                    continue
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+        self.size = total
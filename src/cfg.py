@@ -0,0 +1,193 @@
+﻿#!/usr/bin/env python3
+from . import intermediate
+
+terminators = (
+    intermediate.Jmp,
+    intermediate.JmpIf,
+    intermediate.JmpNotIf,
+    intermediate.Return,
+)
+
+unconditional = (
+    intermediate.Jmp,
+    intermediate.Return,
+)
+
+class Loop(object):
+    def __init__(self, header, blocks):
+        self.header = header
+        self.blocks = blocks
+        self.parent = None
+        self.depth  = 1
+
+    def __repr__(self):
+        return "Loop({}, {})".format(self.header.index, sorted(x.index for x in self.blocks))
+
+class CFG(object):
+    """ Control flow graph of an intermediate.Function.
+
+    Blocks start at every Label and after every jump or return. Jump edges
+    come from the Label.references lists, fall-through edges from the block
+    order. Dominators use the Cooper-Harvey-Kennedy iteration over reverse
+    post order and loops are the natural loops of the back edges, nested by
+    a walk of the dominator tree, so building stays close to linear in the
+    number of instructions.
+    """
+    def __init__(self, function):
+        self.function = function
+        self.blocks   = []
+        self.labels   = {}
+        self.build(function.instructions)
+        self.entry = self.blocks[0]
+        self.order = self.reverse_postorder()
+        self.idom  = self.dominators()
+        self.number_dominator_tree()
+        self.loops = self.find_loops()
+
+    def new_block(self):
+        self.blocks.append(intermediate.BasicBlock(len(self.blocks)))
+        return self.blocks[-1]
+
+    def build(self, instructions):
+        owner = {}
+        block = self.new_block()
+        for x in instructions:
+            if isinstance(x, intermediate.Label):
+                if block.instructions:
+                    block = self.new_block()
+                self.labels[id(x)] = block
+            block.append(x)
+            owner[id(x)] = block
+            if isinstance(x, terminators):
+                block = self.new_block()
+        if not block.instructions and len(self.blocks) > 1:
+            self.blocks.pop()
+
+        for a, b in zip(self.blocks, self.blocks[1:]):
+            if not isinstance(a.last, unconditional):
+                a.join(b)
+        for block in self.blocks:
+            if isinstance(block.first, intermediate.Label):
+                for ref in block.first.references:
+                    source = owner.get(id(ref))
+                    if source is not None:
+                        source.join(block)
+
+    def block_of(self, label):
+        return self.labels[id(label)]
+
+    def reverse_postorder(self):
+        seen  = {self.entry}
+        order = []
+        stack = [(self.entry, iter(self.entry.successors))]
+        while stack:
+            block, succs = stack[-1]
+            for x in succs:
+                if x not in seen:
+                    seen.add(x)
+                    stack.append((x, iter(x.successors)))
+                    break
+            else:
+                order.append(block)
+                stack.pop()
+        order.reverse()
+        return order
+
+    def reachable(self, block):
+        return self.idom[block.index] is not None
+
+    def dominators(self):
+        rpo  = {x.index : i for i, x in enumerate(self.order)}
+        idom = [None] * len(self.blocks)
+        idom[self.entry.index] = self.entry.index
+
+        def intersect(a, b):
+            while a != b:
+                while rpo[a] > rpo[b]:
+                    a = idom[a]
+                while rpo[b] > rpo[a]:
+                    b = idom[b]
+            return a
+
+        changed = True
+        while changed:
+            changed = False
+            for block in self.order[1:]:
+                new = None
+                for pred in block.predecessors:
+                    if idom[pred.index] is None:
+                        continue
+                    new = pred.index if new is None else intersect(pred.index, new)
+                if idom[block.index] != new:
+                    idom[block.index] = new
+                    changed = True
+        return idom
+
+    def number_dominator_tree(self):
+        self.children = children = [[] for _ in self.blocks]
+        for x in self.order[1:]:
+            children[self.idom[x.index]].append(x.index)
+        self.pre  = [0] * len(self.blocks)
+        self.post = [0] * len(self.blocks)
+        counter = 0
+        stack = [(self.entry.index, iter(children[self.entry.index]))]
+        self.pre[self.entry.index] = counter
+        while stack:
+            node, it = stack[-1]
+            child = next(it, None)
+            counter += 1
+            if child is None:
+                self.post[node] = counter
+                stack.pop()
+            else:
+                self.pre[child] = counter
+                stack.append((child, iter(children[child])))
+
+    def dominates(self, a, b):
+        """ True if every path from the entry to block b goes through block a. """
+        if not self.reachable(a) or not self.reachable(b):
+            return False
+        return self.pre[a.index] <= self.pre[b.index] and self.post[b.index] <= self.post[a.index]
+
+    def find_loops(self):
+        loops = {}
+        for block in self.order:
+            for succ in block.successors:
+                if self.dominates(succ, block):
+                    body = loops.setdefault(succ, {succ})
+                    stack = [block]
+                    while stack:
+                        x = stack.pop()
+                        if x not in body:
+                            body.add(x)
+                            stack.extend(p for p in x.predecessors if self.reachable(p))
+        headers = {h.index : Loop(h, b) for h, b in loops.items()}
+        self.nest_loops(headers)
+        return sorted(headers.values(), key=lambda x: len(x.blocks))
+
+    def nest_loops(self, headers):
+        """ Sets each loop's parent and depth, and each block's loop_depth,
+        in one walk of the dominator tree.
+
+        The loops around a block have headers that dominate it, so they
+        are found among the loops around its dominator, or the dominator's
+        own loop. If a header is not in a loop's body, nothing it dominates
+        is either, so each block only walks up past the loops it has left.
+        """
+        stack = [(self.entry.index, None)]
+        while stack:
+            index, loop = stack.pop()
+            block = self.blocks[index]
+            while loop is not None and block not in loop.blocks:
+                loop = loop.parent
+            own = headers.get(index)
+            if own is not None:
+                own.parent = loop
+                own.depth  = 1 if loop is None else loop.depth + 1
+                loop = own
+            block.loop_depth = 0 if loop is None else loop.depth
+            for child in self.children[index]:
+                stack.append((child, loop))
+
+def build(function):
+    return CFG(function)
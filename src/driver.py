@@ -0,0 +1,172 @@
+﻿#!/usr/bin/env python3
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+import functools
+import os
+from . import lexer
+from . import parser
+from . import ast
+from . import intermediate
+from . import lazy
+from . import optimize as optimizer
+from . import stats as instrument
+from .cache import CompileCache, DEFAULT_SIZE
+
+errors = (
+    lexer.LexerException,
+    parser.ParseFail,
+    parser.ParseError,
+    ast.SemanticsException,
+    NotImplementedError,
+)
+
+class CompileResult(namedtuple("CompileResult", ["path", "output", "error", "reports", "stats"], defaults=(None,))):
+    pass
+
+def compile_source(data, jobs=1):
+    """ Runs the whole frontend over data and returns the
+    intermediate.FunctionList. jobs > 1 checks and lowers the functions
+    across that many processes. """
+    if jobs > 1:
+        return compile_parallel(data, jobs)
+    tree = parser.parse(data)
+    context = ast.SemanticContext()
+    with instrument.stage("check"):
+        tree.check_semantics(context)
+    with instrument.stage("lower"):
+        functions = tree.to_intermediate(intermediate.TransformState(context.table.resolutions))
+    instrument.count("ir_instructions", sum(len(x.instructions) for x in functions))
+    return functions
+
+signatures    = None
+collect_stats = False
+
+def set_signatures(functions, collect=False):
+    global signatures, collect_stats
+    signatures    = functions
+    collect_stats = collect
+
+def lower_chunk(text):
+    """ Parses, checks and lowers the functions in text against the
+    signatures given to the worker, each with its own TransformState.
+    Returns (function, temps, labels) for each, and the stats.Stats for the
+    chunk if the parent is collecting them. """
+    if collect_stats:
+        with instrument.collect() as collected:
+            return check_and_lower(text), collected
+    return check_and_lower(text), None
+
+def check_and_lower(text):
+    tree = parser.parse(text)
+    with instrument.stage("check"):
+        table = ast.SymbolTable()
+        for x in signatures:
+            table[x.id] = x
+        for x in tree:
+            ast.walk(x, "_check_semantics", table)
+        table.raise_unresolved()
+    out = []
+    with instrument.stage("lower"):
+        for x in tree:
+            local = intermediate.TransformState(table.resolutions)
+            out.append((x.to_intermediate(local), local.temps, local.labels))
+    return out
+
+def compile_parallel(data, jobs):
+    """ Indexes data with lazy.Module, then has a process pool compile runs
+    of whole functions from their text. The results are merged in order
+    into one TransformState, so the IR is the same as compile_source's. """
+    with instrument.stage("index"):
+        module = lazy.Module(data)
+    entries = list(module.entries.values())
+    tokens = module.tokens.tokens
+    size = max(1, -(-len(entries) // (jobs * 4)))
+    chunks = []
+    for i in range(0, len(entries), size):
+        first, last = entries[i], entries[min(i + size, len(entries)) - 1]
+        end = last.end - 1
+        chunks.append(data[tokens.starts[first.start]:tokens.starts[end] + tokens.lengths[end]])
+    state = intermediate.TransformState()
+    out = intermediate.FunctionList()
+    active = instrument.current()
+    with instrument.stage("parallel"):
+        with ProcessPoolExecutor(max_workers=jobs, initializer=set_signatures,
+                initargs=([x.signature for x in entries], active is not None)) as pool:
+            for chunk, collected in pool.map(lower_chunk, chunks):
+                if collected is not None:
+                    active.merge(collected)
+                for function, temps, labels in chunk:
+                    state.merge(temps, labels)
+                    out.append(function)
+    instrument.count("ir_instructions", sum(len(x.instructions) for x in out))
+    return out
+
+def format_ir(functions):
+    out = []
+    for x in functions:
+        out.append(str(x))
+        for y in x.instructions:
+            out.append("\t" + str(y))
+        out.append("")
+    return "\n".join(out) + "\n"
+
+caches = {}
+
+def open_cache(path, max_size):
+    """ Returns this process's CompileCache for path, so that the directory
+    is only scanned once rather than for every file. """
+    key = (os.path.abspath(path), max_size)
+    out = caches.get(key)
+    if out is None:
+        out = caches[key] = CompileCache(path, max_size)
+    return out
+
+def compile_file(path, cache_dir=None, cache_size=DEFAULT_SIZE, optimize=False, stats=False, jobs=1):
+    """ Compiles one file, across `jobs` processes if jobs > 1. With
+    stats=True the result carries a stats.Stats for this file. """
+    if stats:
+        with instrument.collect() as collected:
+            result = compile_file(path, cache_dir, cache_size, optimize, jobs=jobs)
+        return result._replace(stats=collected)
+    try:
+        with open(path, "rb") as fp:
+            data = fp.read()
+        if cache_dir is None:
+            functions = compile_source(data.decode(), jobs)
+        else:
+            cache = open_cache(cache_dir, cache_size)
+            key = cache.key(data)
+            with instrument.stage("cache"):
+                functions = cache.get(key)
+            if functions is None:
+                instrument.count("cache_misses")
+                functions = compile_source(data.decode(), jobs)
+                with instrument.stage("cache"):
+                    cache.put(key, functions)
+            else:
+                instrument.count("cache_hits")
+        reports = None
+        if optimize:
+            with instrument.stage("optimize"):
+                reports = optimizer.optimize(functions)
+            instrument.count("ir_instructions_optimized", sum(len(x.instructions) for x in functions))
+        with instrument.stage("format"):
+            output = format_ir(functions)
+        return CompileResult(path, output, None, reports)
+    except errors + (UnicodeDecodeError, RecursionError) as e:
+        return CompileResult(path, None, "{}: {}".format(type(e).__name__, e), None)
+    except OSError as e:
+        return CompileResult(path, None, str(e), None)
+
+def compile_files(paths, jobs=1, **kwargs):
+    """ Compiles every path, across `jobs` processes if jobs > 1. Results
+    come back in the order of paths; kwargs are passed to compile_file. A
+    single path is compiled with its functions spread over the processes. """
+    func = functools.partial(compile_file, **kwargs)
+    if len(paths) == 1:
+        return [func(paths[0], jobs=jobs)]
+    if jobs <= 1:
+        return [func(x) for x in paths]
+    chunksize = max(1, len(paths) // (jobs * 4))
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        return list(pool.map(func, paths, chunksize=chunksize))
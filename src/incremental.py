@@ -0,0 +1,81 @@
+﻿#!/usr/bin/env python3
+""" Incremental reparsing of a function_list after a text edit.
+
+Top level functions do not depend on each other syntactically, so after an
+edit only the functions overlapping it, plus any whitespace between them,
+have to be lexed and parsed again. The ast.Function objects of the other
+functions are reused as they are and only their spans are shifted.
+"""
+from . import ast
+from . import lexer
+from . import parser
+
+errors = (lexer.LexerException, parser.ParseError, parser.ParseFail)
+
+class ParseResult(object):
+    """ The text of a file, its FunctionList and the [start, end) character
+    span of every function in it. """
+    def __init__(self, text, functions, spans):
+        self.text = text
+        self.functions = functions
+        self.spans = spans
+
+    def edit(self, offset, removed, inserted):
+        return edit(self, offset, removed, inserted)
+
+def parse_spans(text, base=0):
+    """ Parses text as a function_list, returning the functions and their
+    spans offset by base. """
+    tokens = parser.TokenState(text)
+    starts, lengths = tokens.tokens.starts, tokens.tokens.lengths
+    functions = ast.FunctionList()
+    spans = []
+    while True:
+        first = tokens.pos
+        func = parser.function(tokens)
+        if func is parser.FAIL:
+            break
+        last = tokens.pos - 1
+        functions.append(func)
+        spans.append((base + starts[first], base + starts[last] + lengths[last]))
+    if not parser.accept(tokens, lexer.TokenTypes.EOF):
+        raise parser.ParseFail("Unexpected input.")
+    return functions, spans
+
+def parse(text):
+    return ParseResult(text, *parse_spans(text))
+
+def edit(result, offset, removed, inserted):
+    """ Returns the ParseResult for result.text with `removed` characters at
+    offset replaced by the string inserted.
+
+    A function is kept if it ends at or before the edit or starts after it;
+    the text between the kept functions either side is reparsed on its own.
+    If that fails the whole new text is parsed so that errors are reported
+    with their real positions.
+    """
+    if offset < 0 or removed < 0 or offset + removed > len(result.text):
+        raise ValueError("Edit {}+{} is outside the text".format(offset, removed))
+    text = result.text[:offset] + inserted + result.text[offset + removed:]
+    delta = len(inserted) - removed
+    spans = result.spans
+
+    lo = 0
+    while lo < len(spans) and spans[lo][1] <= offset:
+        lo += 1
+    hi = lo
+    while hi < len(spans) and spans[hi][0] <= offset + removed:
+        hi += 1
+    start = spans[lo - 1][1] if lo else 0
+    end = spans[hi][0] + delta if hi < len(spans) else len(text)
+
+    try:
+        functions, new_spans = parse_spans(text[start:end], start)
+    except errors:
+        return parse(text)
+
+    out = ast.FunctionList(result.functions[:lo])
+    out += functions
+    out += result.functions[hi:]
+    new_spans = spans[:lo] + new_spans + [(x + delta, y + delta) for x, y in spans[hi:]]
+    return ParseResult(text, out, new_spans)
@@ -1,16 +1,222 @@
-import parser
+﻿#!/usr/bin/env python3
+""" Interactive session: run with `python -m src.interactive`.
+
+Each input is one or more functions and statements. Functions are checked
+and lowered once and loaded into a VM that lives as long as the session.
+Statements are checked in a top level scope that keeps its declarations
+between inputs, lowered into a throwaway function and run against the
+session's variables. Commands start with ':', see `:help`.
+
+Builtins are Python callables keyed by a declaration such as
+`function print(int value)`, so calls to them are checked like calls to
+any other function.
+"""
 import sys
+import time
+from collections import OrderedDict
+from contextlib  import contextmanager
+from .           import ast
+from .           import driver
+from .           import intermediate
+from .           import parser
+from .           import vm
 
-if __name__ == "__main__":
-    input = ""
-    last = ""
+help_text = """\
+:time   toggle printing the time taken by each stage
+:ir     toggle printing the lowered IR of each input
+:vars   print the session variables
+:help   print this message
+:quit   leave the session
+"""
+
+def items(tokens):
+    """ Parses any number of functions and statements. """
+    out = []
     while True:
-        sys.stdout.write(">")
+        item = parser.parse_any(tokens, parser.function, parser.statement)
+        if item is parser.FAIL:
+            return out
+        out.append(item)
+
+def complete(text):
+    """ Returns whether text looks like whole inputs rather than the first
+    lines of a function or block. """
+    text = text.strip()
+    return text.count("{") <= text.count("}") and text.endswith((";", "}"))
+
+class Session(object):
+    def __init__(self, builtins=None):
+        self.context = ast.SemanticContext()
+        functions = {}
+        for header, func in (builtins or {}).items():
+            signature = parser.parse(header, parser.function_header)
+            self.context.table[signature.id] = signature
+            functions[str(signature.id)] = func
+        self.scope   = self.context.table.new_scope()
+        self.scope["_return"] = None
+        self.state   = intermediate.TransformState()
+        self.vm      = vm.VM(builtins=functions)
+        self.values  = {}
+        self.ir      = OrderedDict()
+        self.timings = OrderedDict()
+        self.inputs  = 0
+
+    @contextmanager
+    def timed(self, stage):
+        start = time.perf_counter()
+        yield
+        self.timings[stage] = self.timings.get(stage, 0) + time.perf_counter() - start
+
+    @contextmanager
+    def hidden(self):
+        """ Takes the session variables out of the symbol table while a
+        function is checked, as the function cannot see them at run time. """
+        saved = [(x, self.scope.lookup(x).value) for x in self.scope.names]
+        self.scope.close()
+        try:
+            yield
+        finally:
+            for name, value in saved:
+                self.scope[name] = value
+
+    def rollback(self, mark, function=None):
+        """ Drops the bindings made by a failed input: top level names
+        declared after `mark` and anything left behind in inner scopes.
+        function is the (name, bindings) of a function being redefined. """
+        table = self.context.table
+        del self.scope.names[mark:]
+        names = set(self.scope.names)
+        for key, stack in table.bindings.items():
+            stack[:] = [x for x in stack if x.scope is table or (x.scope is self.scope and key in names)]
+        if function is not None:
+            name, previous = function
+            if previous is None:
+                table.bindings.pop(name, None)
+            else:
+                table.bindings[name] = previous
+        del table.unresolved[:]
+        table.resolutions.clear()
+        self.scope.sites = None
+
+    def submit(self, text):
+        """ Compiles and runs text. Returns the intermediate.Functions it
+        lowered to and the value of each expression statement. """
+        self.timings.clear()
+        with self.timed("parse"):
+            tree = parser.parse(text, items)
+        lowered = []
+        results = []
+        for item in tree:
+            if isinstance(item, ast.Function):
+                lowered.append(self.define(item))
+            else:
+                function, value = self.execute(item)
+                lowered.append(function)
+                if value is not None:
+                    results.append(value)
+        return lowered, results
+
+    def define(self, function):
+        name = str(function.id)
+        table = self.context.table
+        previous = table.bindings.pop(name, None)
+        with self.hidden():
+            try:
+                with self.timed("check"):
+                    function.check_semantics(self.context)
+            except:
+                self.rollback(len(self.scope.names), (name, previous))
+                raise
+        with self.timed("lower"):
+            self.state.resolutions = self.context.table.resolutions
+            out = function.to_intermediate(self.state)
+            del self.context.table.resolutions[function]
+            self.vm.load(out)
+        self.ir[name] = out
+        return out
+
+    def execute(self, statement):
+        mark = len(self.scope.names)
+        self.scope.sites = sites = ast.Resolutions()
+        try:
+            with self.timed("check"):
+                ast.walk(statement, "_check_semantics", self.scope)
+                self.scope.sites = None
+                self.context.table.raise_unresolved()
+            with self.timed("lower"):
+                self.inputs += 1
+                function = intermediate.Function("<input {}>".format(self.inputs), [], None)
+                self.state.begin(sites)
+                function.instructions += statement.to_intermediate(self.state)
+                self.state.begin(None)
+                result = None
+                if not isinstance(statement, (ast.Declare, ast.Assign, ast.If, ast.While, ast.Return)):
+                    result = self.state.last_temp()
+                function.instructions += intermediate.Return(result)
+                code = vm.Code(function)
+            with self.timed("run"):
+                regs = list(code.template)
+                for name, slot in code.slots.items():
+                    if name in self.values:
+                        regs[slot] = self.values[name]
+                value = self.vm.execute(code, regs)
+        except:
+            self.rollback(mark)
+            raise
+        for name in self.scope.names:
+            if name in code.slots:
+                self.values[name] = regs[code.slots[name]]
+        return function, value
+
+def main(argv):
+    session = Session(builtins={"function print(int value)" : print})
+    show_time = False
+    show_ir = False
+    while True:
+        sys.stdout.write("> ")
         sys.stdout.flush()
-        line = sys.stdin.readline()
-        if line == "\n" and last == "\n":
-            break
-        last = line
-        input += line
+        text = ""
+        while True:
+            line = sys.stdin.readline()
+            if not line:
+                return 0
+            text += line
+            if text.startswith(":") or not line.strip() or complete(text):
+                break
+            sys.stdout.write(". ")
+            sys.stdout.flush()
+        command = text.strip()
+        if not command:
+            continue
+        if command in (":q", ":quit"):
+            return 0
+        elif command == ":time":
+            show_time = not show_time
+            print("time {}".format("on" if show_time else "off"))
+            continue
+        elif command == ":ir":
+            show_ir = not show_ir
+            print("ir {}".format("on" if show_ir else "off"))
+            continue
+        elif command == ":vars":
+            for name in session.scope.names:
+                if name != "_return":
+                    print("{} = {}".format(name, session.values.get(name)))
+            continue
+        elif command.startswith(":"):
+            sys.stdout.write(help_text)
+            continue
+        try:
+            functions, results = session.submit(text)
+        except (driver.errors + (vm.VMError, ArithmeticError, TypeError)) as e:
+            print("error: {}".format(e))
+            continue
+        if show_ir:
+            sys.stdout.write(driver.format_ir(functions))
+        for value in results:
+            print(value)
+        if show_time:
+            print(", ".join("{} {:.3f} ms".format(x, y * 1000) for x, y in session.timings.items()))
 
-    print(input)
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -1,12 +1,40 @@
 ﻿#!/usr/bin/env python3
 from collections import defaultdict
 from . import ast
+import operator
 
 class TransformState(object):
-    def __init__(self):
+    """ Lowering state. Functions are lowered with a state of their own and
+    merged into the state of the whole list in order, so they can be lowered
+    independently and still number temps and labels as one pass would.
+
+    resolutions is the SymbolTable.resolutions the code was checked with,
+    which gives variables that shadow another their own names. """
+    def __init__(self, resolutions=None):
         self.temp_count = -1
         self.label_count = -1
         self.id_mapping = defaultdict(lambda : -1)
+        self.temps = []
+        self.labels = []
+        self.resolutions = resolutions if resolutions is not None else {}
+        self.sites = None
+        self.renamed = None
+
+    def begin(self, sites):
+        """ Starts lowering code whose names resolved to sites, an
+        ast.Resolutions, or keeps every name as it is if sites is None. """
+        if sites is None:
+            self.sites = None
+        else:
+            self.sites = iter(sites)
+            self.renamed = sites.renamed
+
+    def variable(self, name):
+        """ Returns the variable for the next use site, name itself unless
+        its binding shadows another. """
+        if self.sites is None:
+            return name
+        return self.renamed.get(next(self.sites), name)
 
     def next(self, value):
         return self.id_mapping[value] + 1
@@ -14,11 +42,26 @@ class TransformState(object):
     def temp(self):
         self.temp_count += 1
         self._last_temp = ast.Identifier("_t{}".format(self.temp_count))
+        self.temps.append(self._last_temp)
         return self._last_temp
 
     def label(self):
         self.label_count += 1
-        return Label(self.label_count)
+        out = Label(self.label_count)
+        self.labels.append(out)
+        return out
+
+    def merge(self, temps, labels):
+        """ Renumbers the temps and labels made by another state to follow
+        this state's own. """
+        for x in temps:
+            self.temp_count += 1
+            x.value = "_t{}".format(self.temp_count)
+        for x in labels:
+            self.label_count += 1
+            x.idx = self.label_count
+        self.temps += temps
+        self.labels += labels
 
     def set_last(self, var):
         self._last_temp = var
@@ -36,20 +79,35 @@ class IntermediateRep(object):
 
 
 class BasicBlock(object):
-    def __init__(self):
+    def __init__(self, index=0):
         self.first = None
         self.last  = None
+        self.index = index
+        self.instructions = []
+        self.predecessors = []
+        self.successors   = []
+        self.loop_depth   = 0
+
+    def __repr__(self):
+        return "BasicBlock({})".format(self.index)
 
     def append(self, node):
+        node.next = None
         if self.first == None:
+            node.prev  = None
             self.first = node
             self.last = node
         else:
+            node.prev = self.last
             self.last.next = node
             self.last = node
+        self.instructions.append(node)
 
     def join(self, bb):
-        pass
+        """ Adds an edge from this block to bb. """
+        if bb not in self.successors:
+            self.successors.append(bb)
+            bb.predecessors.append(self)
 
 class InstructionList(list):
     def __init__(self):
@@ -110,6 +168,22 @@ class JmpNotIf(IntermediateRep):
     def __str__(self):
         return "Jmp !{} {}".format(self.var, self.label)
 
+# Integer semantics of every operator in lexer.operations. Division and
+# modulo floor like Python's // and %, comparisons give 1 or 0.
+binops = {
+    "*"  : operator.mul,
+    "/"  : operator.floordiv,
+    "%"  : operator.mod,
+    "+"  : operator.add,
+    "-"  : operator.sub,
+    "<"  : lambda a, b: int(a < b),
+    "<=" : lambda a, b: int(a <= b),
+    ">"  : lambda a, b: int(a > b),
+    ">=" : lambda a, b: int(a >= b),
+    "==" : lambda a, b: int(a == b),
+    "!=" : lambda a, b: int(a != b),
+}
+
 class Op(IntermediateRep):
     def __init__(self, result, op, lhs, rhs):
         self.op = op
@@ -129,12 +203,13 @@ class Assign(IntermediateRep):
         return "{} <- {}".format(self.dest, self.src)
 
 class Call(IntermediateRep):
-    def __init__(self, id, result):
+    def __init__(self, id, result, args=()):
         self.id = id
         self.result = result
+        self.args = list(args)
 
     def __str__(self):
-        return "{} <- call {}".format(self.id, self.result)
+        return "{} <- call {}({})".format(self.result, self.id, ", ".join(str(x) for x in self.args))
 
 class Return(IntermediateRep):
     def __init__(self, var):
@@ -0,0 +1,312 @@
+﻿#!/usr/bin/env python3
+""" Compact binary format for intermediate.FunctionList.
+
+    file     := MAGIC version:varint strings functions
+    strings  := count:varint (length:varint utf8)*
+    functions:= count:varint (name:str params return_type:str? size:varint)* body*
+    body     := labels:varint (idx:varint)* count:varint instruction*
+
+Identifiers and function names are indices into the string table, labels
+are indices into the function's label table and instructions start with a
+varint opcode. Bodies are only decoded when a function is asked for, and
+the reader works on a memoryview of the buffer it is given.
+"""
+from . import ast
+from . import lexer
+from . import intermediate
+
+MAGIC   = b"PCIR"
+VERSION = 2
+
+LABEL     = 0
+JMP       = 1
+JMPIF     = 2
+JMPNOTIF  = 3
+OP        = 4
+ASSIGN    = 5
+CALL      = 6
+RETURN    = 7
+
+NONE       = 0
+IDENTIFIER = 1
+INTEGER    = 2
+
+operators   = list(lexer.operations)
+operator_id = {x : i for i, x in enumerate(operators)}
+
+class FormatError(Exception):
+    pass
+
+def write_varint(out, value):
+    while value > 0x7f:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+
+def read_varint(data, pos):
+    shift = 0
+    value = 0
+    while True:
+        try:
+            byte = data[pos]
+        except IndexError:
+            raise FormatError("Truncated varint")
+        pos += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+def zigzag(value):
+    return value << 1 if value >= 0 else (-value << 1) - 1
+
+def unzigzag(value):
+    return value >> 1 if not value & 1 else -(value >> 1) - 1
+
+class Writer(object):
+    def __init__(self):
+        self.strings = {}
+
+    def string(self, value):
+        value = str(value)
+        try:
+            return self.strings[value]
+        except KeyError:
+            self.strings[value] = len(self.strings)
+            return self.strings[value]
+
+    def operand(self, out, value):
+        if value is None:
+            out.append(NONE)
+        elif isinstance(value, ast.IntegerLiteral):
+            out.append(INTEGER)
+            write_varint(out, zigzag(int(value.value)))
+        else:
+            out.append(IDENTIFIER)
+            write_varint(out, self.string(value))
+
+    def body(self, function):
+        labels = {}
+        def label(x):
+            if id(x) not in labels:
+                labels[id(x)] = (len(labels), x.idx)
+            return labels[id(x)][0]
+
+        code = bytearray()
+        write_varint(code, len(function.instructions))
+        for x in function.instructions:
+            if isinstance(x, intermediate.Op):
+                code.append(OP)
+                code.append(operator_id[str(x.op)])
+                self.operand(code, x.result)
+                self.operand(code, x.lhs)
+                self.operand(code, x.rhs)
+            elif isinstance(x, intermediate.Assign):
+                code.append(ASSIGN)
+                self.operand(code, x.dest)
+                self.operand(code, x.src)
+            elif isinstance(x, intermediate.Label):
+                code.append(LABEL)
+                write_varint(code, label(x))
+            elif isinstance(x, intermediate.Jmp):
+                code.append(JMP)
+                write_varint(code, label(x.label))
+            elif isinstance(x, intermediate.JmpNotIf):
+                code.append(JMPNOTIF)
+                write_varint(code, label(x.label))
+                self.operand(code, x.var)
+            elif isinstance(x, intermediate.JmpIf):
+                code.append(JMPIF)
+                write_varint(code, label(x.label))
+                self.operand(code, x.var)
+            elif isinstance(x, intermediate.Return):
+                code.append(RETURN)
+                self.operand(code, x.var)
+            elif isinstance(x, intermediate.Call):
+                code.append(CALL)
+                write_varint(code, self.string(x.id))
+                self.operand(code, x.result)
+                write_varint(code, len(x.args))
+                for y in x.args:
+                    self.operand(code, y)
+            else:
+                raise FormatError("Cannot serialize {}".format(type(x).__name__))
+
+        out = bytearray()
+        write_varint(out, len(labels))
+        for _, idx in sorted(labels.values()):
+            write_varint(out, idx)
+        return out + code
+
+    def dumps(self, functions):
+        bodies = [self.body(x) for x in functions]
+        index = bytearray()
+        write_varint(index, len(functions))
+        for function, body in zip(functions, bodies):
+            write_varint(index, self.string(function.id))
+            params = function.params or ()
+            write_varint(index, len(params))
+            for x in params:
+                write_varint(index, self.string(x))
+            if function.return_type is None:
+                write_varint(index, 0)
+            else:
+                write_varint(index, self.string(function.return_type) + 1)
+            write_varint(index, len(body))
+
+        out = bytearray(MAGIC)
+        write_varint(out, VERSION)
+        write_varint(out, len(self.strings))
+        for x in self.strings:
+            data = x.encode("utf-8")
+            write_varint(out, len(data))
+            out += data
+        out += index
+        for x in bodies:
+            out += x
+        return bytes(out)
+
+class Reader(object):
+    """ Lazy sequence of intermediate.Functions over a serialized buffer. """
+    def __init__(self, data):
+        self.data = memoryview(data)
+        if bytes(self.data[:len(MAGIC)]) != MAGIC:
+            raise FormatError("Not an IR file")
+        version, pos = read_varint(self.data, len(MAGIC))
+        if version != VERSION:
+            raise FormatError("Unsupported IR version {}".format(version))
+
+        count, pos = read_varint(self.data, pos)
+        self.strings = []
+        for _ in range(count):
+            size, pos = read_varint(self.data, pos)
+            if pos + size > len(self.data):
+                raise FormatError("Truncated string table")
+            try:
+                self.strings.append(str(self.data[pos:pos + size], "utf-8"))
+            except UnicodeDecodeError:
+                raise FormatError("Invalid string in string table")
+            pos += size
+
+        count, pos = read_varint(self.data, pos)
+        self.index = []
+        for _ in range(count):
+            name, pos = read_varint(self.data, pos)
+            nparams, pos = read_varint(self.data, pos)
+            params = []
+            for _ in range(nparams):
+                param, pos = read_varint(self.data, pos)
+                params.append(param)
+            return_type, pos = read_varint(self.data, pos)
+            size, pos = read_varint(self.data, pos)
+            self.index.append((name, params, return_type, size))
+
+        self.offsets = []
+        for *_, size in self.index:
+            self.offsets.append(pos)
+            pos += size
+        if pos != len(self.data):
+            raise FormatError("Truncated IR file" if pos > len(self.data) else "Trailing data in IR file")
+        self.functions = [None] * len(self.index)
+
+    def __len__(self):
+        return len(self.index)
+
+    def __getitem__(self, i):
+        if self.functions[i] is None:
+            try:
+                self.functions[i] = self.decode(i)
+            except IndexError:
+                # A bad opcode operand, label, string or operator index.
+                raise FormatError("Corrupt body for function {}".format(i))
+        return self.functions[i]
+
+    def names(self):
+        return [self.strings[x[0]] for x in self.index]
+
+    def decode(self, i):
+        name, params, return_type, size = self.index[i]
+        out = intermediate.Function(ast.Identifier(self.strings[name]))
+        if params:
+            out.params = [ast.Identifier(self.strings[x]) for x in params]
+        if return_type:
+            out.return_type = ast.Type(self.strings[return_type - 1])
+
+        pos = self.offsets[i]
+        data = self.data[:pos + size]
+        identifiers = {}
+        def operand(pos):
+            tag = data[pos]
+            pos += 1
+            if tag == NONE:
+                return None, pos
+            value, pos = read_varint(data, pos)
+            if tag == INTEGER:
+                return ast.IntegerLiteral(str(unzigzag(value))), pos
+            if value not in identifiers:
+                identifiers[value] = ast.Identifier(self.strings[value])
+            return identifiers[value], pos
+
+        count, pos = read_varint(data, pos)
+        labels = []
+        for _ in range(count):
+            idx, pos = read_varint(data, pos)
+            labels.append(intermediate.Label(idx))
+
+        count, pos = read_varint(data, pos)
+        instructions = out.instructions
+        for _ in range(count):
+            opcode = data[pos]
+            pos += 1
+            if opcode == OP:
+                op = ast.Operation(operators[data[pos]])
+                result, pos = operand(pos + 1)
+                lhs, pos = operand(pos)
+                rhs, pos = operand(pos)
+                instructions.append(intermediate.Op(result, op, lhs, rhs))
+            elif opcode == ASSIGN:
+                dest, pos = operand(pos)
+                src, pos = operand(pos)
+                instructions.append(intermediate.Assign(dest, src))
+            elif opcode == LABEL:
+                label, pos = read_varint(data, pos)
+                instructions.append(labels[label])
+            elif opcode == JMP:
+                label, pos = read_varint(data, pos)
+                instructions.append(intermediate.Jmp(labels[label]))
+            elif opcode == JMPNOTIF:
+                label, pos = read_varint(data, pos)
+                var, pos = operand(pos)
+                instructions.append(intermediate.JmpNotIf(labels[label], var))
+            elif opcode == JMPIF:
+                label, pos = read_varint(data, pos)
+                var, pos = operand(pos)
+                instructions.append(intermediate.JmpIf(labels[label], var))
+            elif opcode == RETURN:
+                var, pos = operand(pos)
+                instructions.append(intermediate.Return(var))
+            elif opcode == CALL:
+                id, pos = read_varint(data, pos)
+                result, pos = operand(pos)
+                nargs, pos = read_varint(data, pos)
+                args = []
+                for _ in range(nargs):
+                    arg, pos = operand(pos)
+                    args.append(arg)
+                instructions.append(intermediate.Call(ast.Identifier(self.strings[id]), result, args))
+            else:
+                raise FormatError("Unknown opcode {}".format(opcode))
+        if pos != len(data):
+            raise FormatError("Trailing data in body for function {}".format(i))
+        return out
+
+def dumps(functions):
+    return Writer().dumps(functions)
+
+def loads(data):
+    """ Decodes every function in data into an intermediate.FunctionList. """
+    reader = Reader(data)
+    out = intermediate.FunctionList()
+    for i in range(len(reader)):
+        out.append(reader[i])
+    return out
@@ -0,0 +1,137 @@
+﻿#!/usr/bin/env python3
+""" Lazy, on-demand compilation of a function_list.
+
+Module lexes its input once and indexes it: every function's header is
+parsed but its body is skipped by matching braces. A body is only parsed,
+checked and lowered the first time the function is asked for, either
+directly or by a VM that was given Module.load as its loader.
+
+Bodies are checked against a table of every signature in the module, as
+FunctionList does when the whole list is checked at once.
+"""
+from collections import OrderedDict
+from .           import ast
+from .           import intermediate
+from .           import lexer
+from .           import parser
+from .           import vm
+
+class Entry(object):
+    """ One indexed function. `signature` is its ast.Function without
+    statements, and `start`, `body` and `end` are the token indices of its
+    `function` keyword, its opening brace and the token after its closing
+    brace. """
+    def __init__(self, index, signature, start, body, end):
+        self.index     = index
+        self.signature = signature
+        self.start     = start
+        self.body      = body
+        self.end       = end
+        self.function  = None
+
+    def __repr__(self):
+        params = ", ".join("{} {}".format(x.type, x.id) for x in self.signature.params)
+        out = "{}({})".format(self.signature.id, params)
+        if self.signature.return_type is not None:
+            out += " -> {}".format(self.signature.return_type)
+        return out
+
+class Module(object):
+    def __init__(self, data):
+        self.tokens  = parser.TokenState(data)
+        self.entries = OrderedDict()
+        self.state   = intermediate.TransformState()
+        self.table   = None
+        self.index()
+
+    def index(self):
+        tokens = self.tokens
+        ids = tokens.ids
+        lbrace = lexer.token_codes["{"]
+        rbrace = lexer.token_codes["}"]
+        while True:
+            start = tokens.pos
+            signature = parser.function_header(tokens)
+            if signature is parser.FAIL:
+                break
+            name = str(signature.id)
+            if name in self.entries:
+                raise ast.SemanticsException("Trying to insert existing identifier '{}' into scope.".format(name))
+            body = tokens.pos
+            if not tokens.match("{"):
+                raise parser.ParseError("Could not parse function")
+            depth = 0
+            for pos in range(body, len(ids)):
+                code = ids[pos]
+                if code == lbrace:
+                    depth += 1
+                elif code == rbrace:
+                    depth -= 1
+                    if not depth:
+                        break
+            else:
+                raise parser.ParseError("Unbalanced braces in function '{}'".format(name))
+            tokens.pos = pos + 1
+            self.entries[name] = Entry(len(self.entries), signature, start, body, tokens.pos)
+        if not parser.accept(tokens, lexer.TokenTypes.EOF):
+            raise parser.ParseFail("Unexpected input.")
+
+    def __contains__(self, name):
+        return str(name) in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def load(self, name):
+        """ Returns the intermediate.Function for name, compiling it on first
+        use, or None if there is no such function. """
+        entry = self.entries.get(str(name))
+        if entry is None:
+            return None
+        if entry.function is None:
+            entry.function = self.compile(entry)
+        return entry.function
+
+    def __getitem__(self, name):
+        out = self.load(name)
+        if out is None:
+            raise KeyError(name)
+        return out
+
+    def compile(self, entry):
+        tokens = self.tokens
+        tokens.pos = entry.body
+        statements = parser.required(parser.braced_stmt_list(tokens), "Could not parse function")
+        if tokens.pos != entry.end:
+            raise parser.ParseError("Could not parse function")
+
+        signature = entry.signature
+        function = ast.Function(id=signature.id, params=signature.params,
+            return_type=signature.return_type, statements=statements)
+        if self.table is None:
+            self.table = ast.SymbolTable()
+            for name, x in self.entries.items():
+                self.table[name] = x.signature
+        try:
+            function.check_semantics(ast.SemanticContext(self.table))
+        except:
+            # A failed check can leave bindings behind, start over next time.
+            self.table = None
+            raise
+        self.state.resolutions = self.table.resolutions
+        return function.to_intermediate(self.state)
+
+    def compiled(self):
+        """ Returns the names of the functions compiled so far. """
+        return [x for x, y in self.entries.items() if y.function is not None]
+
+    def functions(self):
+        """ Compiles everything, returning an intermediate.FunctionList. """
+        out = intermediate.FunctionList()
+        for name in self.entries:
+            out.append(self.load(name))
+        return out
+
+    def vm(self, builtins=None):
+        """ Returns a VM that compiles functions as they are called. """
+        return vm.VM(builtins=builtins, loader=self.load)
@@ -1,5 +1,7 @@
 ﻿#!/usr/bin/env python3
 import re
+import mmap
+from array import array
 from collections import namedtuple, OrderedDict
 from enum import Enum
 
@@ -52,19 +54,53 @@ class TokenTypes(Enum):
 token_regexprs = (
     (TokenTypes.INT_LITERAL, r"[0-9]+"),
     (TokenTypes.IDENTIFIER,  r"[a-zA-Z][a-zA-Z0-9_]*"),
-    (TokenTypes.LARROW,      re.escape("->")),
-    (TokenTypes.LARROW,      re.escape("<-")),
-    (TokenTypes.ASSIGN,      re.escape(":=")),
-    (TokenTypes.LPAREN,      re.escape("(")),
-    (TokenTypes.RPAREN,      re.escape(")")),
-    (TokenTypes.LBRACE,      re.escape("{")),
-    (TokenTypes.RBRACE,      re.escape("}")),
-    (TokenTypes.SEMICOLON,   re.escape(";")),
-    (TokenTypes.COLON,       re.escape(",")),
-    (TokenTypes.BINOP,       "|".join([re.escape(x) for x in operations])),
-    (TokenTypes.WHITESPACE,  r"[ \t\n]"),
+    (TokenTypes.WHITESPACE,  r"[ \t\n]+"),
 )
 
+token_literals = (
+    (TokenTypes.LARROW,      "->"),
+    (TokenTypes.LARROW,      "<-"),
+    (TokenTypes.ASSIGN,      ":="),
+    (TokenTypes.LPAREN,      "("),
+    (TokenTypes.RPAREN,      ")"),
+    (TokenTypes.LBRACE,      "{"),
+    (TokenTypes.RBRACE,      "}"),
+    (TokenTypes.SEMICOLON,   ";"),
+    (TokenTypes.COLON,       ","),
+) + tuple((TokenTypes.BINOP, x) for x in operations)
+
+def build_pattern():
+    """ Combines every token kind into a single alternation of named groups.
+
+    Python alternation is first-match rather than longest-match, so the
+    literals are tried longest first; the regex classes never overlap with
+    the literals so this gives the same result as trying every kind and
+    keeping the longest. Returns (pattern, {group name : token type}).
+    """
+    groups = []
+    types  = {}
+    for type, regex in token_regexprs:
+        groups.append((type, regex))
+    for type, text in sorted(token_literals, key=lambda x: -len(x[1])):
+        groups.append((type, re.escape(text)))
+    for i, (type, regex) in enumerate(groups):
+        types["{}_{}".format(type.name, i)] = type
+    pattern = "|".join("(?P<{}_{}>{})".format(type.name, i, regex) for i, (type, regex) in enumerate(groups))
+    return re.compile(pattern), types
+
+token_pattern, token_groups = build_pattern()
+token_pattern_bytes = re.compile(token_pattern.pattern.encode("ascii"))
+longest_literal = max(len(x) for _, x in token_literals)
+
+# Integer codes used to compare tokens without building them. Codes below
+# ID_BASE are TokenTypes values, codes from ID_BASE up are interned ids of
+# the keywords and fixed text tokens.
+ID_BASE     = 64
+token_ids   = {x : ID_BASE + i for i, x in enumerate(keywords + tuple(x for _, x in token_literals))}
+token_codes = dict(token_ids)
+token_codes.update((x, x.value) for x in TokenTypes)
+types_by_value = {x.value : x for x in TokenTypes}
+
 class Token(namedtuple("Token", ["type", "data", "line", "column"])):
     def underline(self, data):
         t = data.split("\n")[self.line - 1]
@@ -95,33 +131,167 @@ class LexerException(Exception):
 
 """ returns (toktext, type, rest) """
 def get_next(data):
-    toktext = ""
-    toktype = None
-    for type, regex in token_regexprs:
-        match = re.match(r"^({})(.*)".format(regex), data, re.DOTALL)
-        if match:
-            tok_data = match.groups()[0]
-            if len(tok_data) > len(toktext):
-                toktext = tok_data
-                toktype = type
-
-    if toktype == None or toktext == "":
-        raise LexerException()
+    match = token_pattern.match(data)
+    if match is None:
+        raise LexerException("Unexpected input {!r}".format(data[:1]))
+    toktext = match.group()
+    return toktext, token_groups[match.lastgroup], data[len(toktext):]
 
-    return toktext, toktype, data[len(toktext):]
+def lex_chunks(chunks):
+    """ Lexes an iterable of str or bytes chunks, yielding Tokens lazily.
 
-def lex(data):
+    A match that runs into the end of a chunk may continue in the next one
+    (identifiers, whitespace, "<" followed by "="), so it is only accepted
+    once the following chunk has been read; the unconsumed tail is carried
+    over. Only two chunks are held in memory at a time.
+    """
+    chunks = iter(chunks)
+    data   = next(chunks, None)
     line   = 1
     column = 1
-    while data:
-        tok, type, data = get_next(data)
+    pos    = 0
+    while data is not None:
+        decode = not isinstance(data, str)
+        if decode:
+            match   = token_pattern_bytes.match
+            newline = b"\n"
+        else:
+            match   = token_pattern.match
+            newline = "\n"
+        following = next(chunks, None)
+        final     = following is None
+        end       = len(data)
+        while pos < end:
+            m = match(data, pos)
+            if m is None:
+                if not final and end - pos < longest_literal:
+                    break
+                raise LexerException("Unexpected input {!r} at line {} column {}".format(data[pos:pos + 1], line, column))
+            if m.end() == end and not final:
+                break
+            type = token_groups[m.lastgroup]
+            tok  = m.group()
+            pos  = m.end()
 
-        if type == TokenTypes.IDENTIFIER and tok in keywords:
-            type = TokenTypes.KEYWORD
-        if type != TokenTypes.WHITESPACE:
+            if type == TokenTypes.WHITESPACE:
+                newlines = tok.count(newline)
+                if newlines:
+                    line  += newlines
+                    column = len(tok) - tok.rindex(newline)
+                else:
+                    column += len(tok)
+                continue
+            if decode:
+                tok = tok.decode("ascii")
+            if type == TokenTypes.IDENTIFIER and tok in keywords:
+                type = TokenTypes.KEYWORD
             yield Token(type, tok, line, column)
-        column += len(tok)
-        if tok == "\n":
-            line += 1
-            column = 1
-    yield Token(TokenTypes.EOF, "", line, column)
\ No newline at end of file
+            column += len(tok)
+        if not final:
+            following = data[pos:] + following
+            pos = 0
+        data = following
+    yield Token(TokenTypes.EOF, "", line, column)
+
+def lex(data):
+    return lex_chunks((data,))
+
+def lex_stream(fp, chunk_size = 1 << 16):
+    """ Lexes a binary or text file object, reading chunk_size at a time. """
+    return lex_chunks(iter(lambda: fp.read(chunk_size), fp.read(0)))
+
+def lex_file(path, chunk_size = 1 << 16):
+    """ Lexes the file at path from an mmap, falling back to a chunked reader
+    for files that cannot be mapped (empty files, pipes). """
+    with open(path, "rb") as fp:
+        try:
+            data = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        except (ValueError, OSError):
+            yield from lex_stream(fp, chunk_size)
+            return
+        with data:
+            yield from lex_chunks((data,))
+
+class TokenBuffer(object):
+    """ Struct-of-arrays token store over a str, bytes or mmap buffer.
+
+    Each token costs one byte of type, one byte of interned id (0 if the
+    text is not interned) and four unsigned ints; the text is only sliced
+    out of the buffer when asked for.
+    """
+    def __init__(self, data):
+        self.data    = data
+        self.types   = array("B")
+        self.ids     = array("B")
+        self.starts  = array("I")
+        self.lengths = array("I")
+        self.lines   = array("I")
+        self.columns = array("I")
+        self.decode  = not isinstance(data, str)
+        self._lex()
+
+    def _lex(self):
+        data = self.data
+        if self.decode:
+            match   = token_pattern_bytes.match
+            newline = b"\n"
+            ids     = {x.encode("ascii") : y for x, y in token_ids.items()}
+        else:
+            match   = token_pattern.match
+            newline = "\n"
+            ids     = token_ids
+        groups     = {x : y.value for x, y in token_groups.items()}
+        whitespace = TokenTypes.WHITESPACE.value
+        identifier = TokenTypes.IDENTIFIER.value
+        keyword    = TokenTypes.KEYWORD.value
+        types, tok_ids, starts, lengths, lines, columns = (
+            self.types, self.ids, self.starts, self.lengths, self.lines, self.columns)
+        line   = 1
+        column = 1
+        pos    = 0
+        end    = len(data)
+        while pos < end:
+            m = match(data, pos)
+            if m is None:
+                raise LexerException("Unexpected input {!r} at line {} column {}".format(data[pos:pos + 1], line, column))
+            type = groups[m.lastgroup]
+            tok  = m.group()
+            if type == whitespace:
+                newlines = tok.count(newline)
+                if newlines:
+                    line  += newlines
+                    column = len(tok) - tok.rindex(newline)
+                else:
+                    column += len(tok)
+                pos = m.end()
+                continue
+            id = ids.get(tok, 0)
+            if type == identifier and id:
+                type = keyword
+            types.append(type)
+            tok_ids.append(id)
+            starts.append(pos)
+            lengths.append(len(tok))
+            lines.append(line)
+            columns.append(column)
+            column += len(tok)
+            pos = m.end()
+        types.append(TokenTypes.EOF.value)
+        tok_ids.append(0)
+        starts.append(end)
+        lengths.append(0)
+        lines.append(line)
+        columns.append(column)
+
+    def __len__(self):
+        return len(self.types)
+
+    def __getitem__(self, index):
+        return Token(types_by_value[self.types[index]], self.text(index), self.lines[index], self.columns[index])
+
+    def text(self, index):
+        start = self.starts[index]
+        out = self.data[start:start + self.lengths[index]]
+        if self.decode:
+            return out.decode("ascii")
+        return out
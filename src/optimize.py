@@ -0,0 +1,370 @@
+﻿#!/usr/bin/env python3
+import heapq
+from collections import namedtuple
+from . import ast
+from . import cfg
+from . import intermediate
+
+def constant(value, env):
+    """ The integer value of an operand under env, or None if unknown. """
+    if isinstance(value, ast.IntegerLiteral):
+        return int(value.value)
+    if value is None:
+        return None
+    return env.get(str(value))
+
+def fold(op, lhs, rhs):
+    try:
+        return intermediate.binops[str(op)](lhs, rhs)
+    except ZeroDivisionError:
+        return None
+
+def transfer(x, env):
+    """ Updates env, a dict of variable name -> known constant, for x. """
+    if isinstance(x, intermediate.Op):
+        lhs = constant(x.lhs, env)
+        rhs = constant(x.rhs, env)
+        value = None
+        if lhs is not None and rhs is not None:
+            value = fold(x.op, lhs, rhs)
+        dest = x.result
+    elif isinstance(x, intermediate.Assign):
+        value = constant(x.src, env)
+        dest = x.dest
+    elif isinstance(x, intermediate.Call):
+        value = None
+        dest = x.result
+    else:
+        return
+    if value is None:
+        env.pop(str(dest), None)
+    else:
+        env[str(dest)] = value
+
+def executable_successors(block, env):
+    """ The successors a block can reach, skipping the side of a JmpNotIf
+    whose condition is known. """
+    last = block.last
+    if isinstance(last, (intermediate.JmpNotIf, intermediate.JmpIf)):
+        cond = constant(last.var, env)
+        if cond is not None:
+            taken = (cond == 0) == isinstance(last, intermediate.JmpNotIf)
+            for succ in block.successors:
+                if (succ.first is last.label) == taken:
+                    return [succ]
+    return block.successors
+
+def propagate(graph):
+    """ Forward constant propagation over graph. Returns the environment at
+    the start of every block, or None for blocks that are never executed.
+    A variable missing from an environment is not constant. """
+    ins  = [None] * len(graph.blocks)
+    ins[graph.entry.index] = {}
+    work = [graph.entry]
+    queued = {graph.entry}
+    while work:
+        block = work.pop()
+        queued.discard(block)
+        env = dict(ins[block.index])
+        for x in block.instructions:
+            transfer(x, env)
+        for succ in executable_successors(block, env):
+            old = ins[succ.index]
+            if old is None:
+                new = dict(env)
+            else:
+                new = {k : v for k, v in old.items() if env.get(k) == v}
+                if len(new) == len(old):
+                    continue
+            ins[succ.index] = new
+            if succ not in queued:
+                queued.add(succ)
+                work.append(succ)
+    return ins
+
+def literal(value):
+    return ast.IntegerLiteral(str(value))
+
+def fold_constants(function):
+    """ Propagates and folds constants in function.instructions, using the
+    operator semantics in intermediate.binops. Operands with a known value
+    become literals, Ops on two known values become Assigns and JmpNotIfs
+    on a known condition become a Jmp or are removed. Returns the number of
+    instructions changed. """
+    graph = cfg.build(function)
+    ins = propagate(graph)
+    out = intermediate.InstructionList()
+    changed = 0
+    for block in graph.blocks:
+        env = ins[block.index]
+        if env is None:
+            out.extend(block.instructions)
+            continue
+        env = dict(env)
+        for x in block.instructions:
+            new = x
+            if isinstance(x, intermediate.Op):
+                lhs = constant(x.lhs, env)
+                rhs = constant(x.rhs, env)
+                value = fold(x.op, lhs, rhs) if lhs is not None and rhs is not None else None
+                if value is not None:
+                    new = intermediate.Assign(x.result, literal(value))
+                else:
+                    if lhs is not None and not isinstance(x.lhs, ast.IntegerLiteral):
+                        x.lhs = literal(lhs)
+                        changed += 1
+                    if rhs is not None and not isinstance(x.rhs, ast.IntegerLiteral):
+                        x.rhs = literal(rhs)
+                        changed += 1
+            elif isinstance(x, intermediate.Assign):
+                value = constant(x.src, env)
+                if value is not None and not isinstance(x.src, ast.IntegerLiteral):
+                    new = intermediate.Assign(x.dest, literal(value))
+            elif isinstance(x, (intermediate.JmpNotIf, intermediate.JmpIf)):
+                cond = constant(x.var, env)
+                if cond is not None:
+                    x.label.references.remove(x)
+                    taken = (cond == 0) == isinstance(x, intermediate.JmpNotIf)
+                    new = intermediate.Jmp(x.label) if taken else None
+            elif isinstance(x, intermediate.Return):
+                value = constant(x.var, env)
+                if value is not None and not isinstance(x.var, ast.IntegerLiteral):
+                    new = intermediate.Return(literal(value))
+            elif isinstance(x, intermediate.Call):
+                for i, arg in enumerate(x.args):
+                    value = constant(arg, env)
+                    if value is not None and not isinstance(arg, ast.IntegerLiteral):
+                        x.args[i] = literal(value)
+                        changed += 1
+            transfer(x, env)
+            if new is not x:
+                changed += 1
+            if new is not None:
+                out.append(new)
+    function.instructions = out
+    return changed
+
+class Report(namedtuple("Report", ["function", "before", "after"])):
+    def __str__(self):
+        return "{}: {} -> {} instructions".format(self.function, self.before, self.after)
+
+def is_temp(name):
+    return name.startswith("_t")
+
+def name(value):
+    if value is None or isinstance(value, ast.IntegerLiteral):
+        return None
+    return str(value)
+
+def defs(x):
+    if isinstance(x, intermediate.Op):
+        return name(x.result)
+    if isinstance(x, intermediate.Assign):
+        return name(x.dest)
+    if isinstance(x, intermediate.Call):
+        return name(x.result)
+    return None
+
+def uses(x):
+    if isinstance(x, intermediate.Op):
+        operands = (x.lhs, x.rhs)
+    elif isinstance(x, intermediate.Assign):
+        operands = (x.src,)
+    elif isinstance(x, (intermediate.JmpNotIf, intermediate.JmpIf)):
+        operands = (x.var,)
+    elif isinstance(x, intermediate.Return):
+        operands = (x.var,)
+    elif isinstance(x, intermediate.Call):
+        operands = x.args
+    else:
+        return ()
+    return [y for y in map(name, operands) if y is not None]
+
+def set_dest(x, value):
+    if isinstance(x, intermediate.Op):
+        x.result = value
+    else:
+        x.dest = value
+
+def drop_jumps(instructions):
+    for x in instructions:
+        if isinstance(x, (intermediate.Jmp, intermediate.JmpIf, intermediate.JmpNotIf)):
+            x.label.references.remove(x)
+
+def remove_unreachable(function):
+    """ Drops blocks that cannot be reached from the entry, including code
+    after a Return, and Jmps to the label that directly follows them. """
+    graph = cfg.build(function)
+    out = intermediate.InstructionList()
+    for block in graph.blocks:
+        if graph.reachable(block):
+            out.extend(block.instructions)
+        else:
+            drop_jumps(block.instructions)
+
+    instructions = intermediate.InstructionList()
+    for i, x in enumerate(out):
+        if isinstance(x, intermediate.Jmp):
+            following = i + 1
+            while following < len(out) and isinstance(out[following], intermediate.Label):
+                if out[following] is x.label:
+                    break
+                following += 1
+            if following < len(out) and out[following] is x.label:
+                drop_jumps((x,))
+                continue
+        instructions.append(x)
+    function.instructions = instructions
+
+def remove_unused_labels(function):
+    out = intermediate.InstructionList()
+    for x in function.instructions:
+        if isinstance(x, intermediate.Label) and not x.references:
+            continue
+        out.append(x)
+    function.instructions = out
+
+def liveness(graph):
+    """ Returns the set of variables live on exit from every block. """
+    gen  = []
+    kill = []
+    for block in graph.blocks:
+        g = set()
+        k = set()
+        for x in reversed(block.instructions):
+            d = defs(x)
+            if d is not None:
+                g.discard(d)
+                k.add(d)
+            g.update(uses(x))
+        gen.append(g)
+        kill.append(k)
+
+    live_in  = [set() for _ in graph.blocks]
+    live_out = [set() for _ in graph.blocks]
+    changed = True
+    while changed:
+        changed = False
+        for block in reversed(graph.blocks):
+            i = block.index
+            out = set()
+            for succ in block.successors:
+                out |= live_in[succ.index]
+            new = gen[i] | (out - kill[i])
+            live_out[i] = out
+            if new != live_in[i]:
+                live_in[i] = new
+                changed = True
+    return live_in, live_out
+
+def eliminate_dead_code(function):
+    """ Coalesces a definition of a temporary with the copy out of it that
+    follows, and removes definitions whose value is never read. Returns
+    True if anything changed. """
+    graph = cfg.build(function)
+    live_in, live_out = liveness(graph)
+    out = intermediate.InstructionList()
+    changed = False
+    for block in graph.blocks:
+        live = set(live_out[block.index])
+        kept = []
+        following_live = None
+        for x in reversed(block.instructions):
+            d = defs(x)
+            if d is not None and not isinstance(x, intermediate.Call):
+                copy = kept[-1] if kept else None
+                if (is_temp(d) and isinstance(copy, intermediate.Assign) and name(copy.src) == d
+                        and d not in following_live):
+                    set_dest(x, copy.dest)
+                    kept.pop()
+                    live = following_live
+                    d = name(copy.dest)
+                    changed = True
+                if d not in live or (isinstance(x, intermediate.Assign) and name(x.src) == d):
+                    changed = True
+                    continue
+            following_live = set(live)
+            if d is not None:
+                live.discard(d)
+            live.update(uses(x))
+            kept.append(x)
+        out.extend(reversed(kept))
+    function.instructions = out
+    return changed
+
+def reuse_temps(function):
+    """ Renames temporaries so that ones with disjoint live ranges share a
+    name, using a linear scan over the range of points each is live. Point
+    2i is where instruction i reads its operands and 2i + 1 where it
+    writes its result, so a temporary can take the name of one whose last
+    read is in the instruction that defines it. """
+    graph = cfg.build(function)
+    live_in, live_out = liveness(graph)
+    ranges = {}
+    def mark(var, point):
+        if is_temp(var):
+            start, end = ranges.get(var, (point, point))
+            ranges[var] = (min(start, point), max(end, point))
+
+    pos = 0
+    for block in graph.blocks:
+        start = pos
+        pos += len(block.instructions)
+        for var in live_in[block.index]:
+            mark(var, 2 * start)
+        for var in live_out[block.index]:
+            mark(var, 2 * pos - 1)
+        for i, x in enumerate(block.instructions):
+            d = defs(x)
+            if d is not None:
+                mark(d, 2 * (start + i) + 1)
+            for var in uses(x):
+                mark(var, 2 * (start + i))
+
+    names  = {}
+    free   = []
+    active = []
+    count  = 0
+    for var, (start, end) in sorted(ranges.items(), key=lambda x: (x[1][0], x[0])):
+        while active and active[0][0] < start:
+            heapq.heappush(free, heapq.heappop(active)[1])
+        if free:
+            slot = heapq.heappop(free)
+        else:
+            slot = count
+            count += 1
+        names[var] = ast.Identifier("_t{}".format(slot))
+        heapq.heappush(active, (end, slot))
+
+    def rename(value):
+        n = name(value)
+        if n is not None and n in names:
+            return names[n]
+        return value
+
+    for x in function.instructions:
+        if isinstance(x, intermediate.Op):
+            x.result, x.lhs, x.rhs = rename(x.result), rename(x.lhs), rename(x.rhs)
+        elif isinstance(x, intermediate.Assign):
+            x.dest, x.src = rename(x.dest), rename(x.src)
+        elif isinstance(x, (intermediate.JmpNotIf, intermediate.JmpIf, intermediate.Return)):
+            x.var = rename(x.var)
+        elif isinstance(x, intermediate.Call):
+            x.result = rename(x.result)
+            x.args = [rename(y) for y in x.args]
+    return count
+
+def optimize_function(function):
+    before = len(function.instructions)
+    fold_constants(function)
+    remove_unreachable(function)
+    remove_unused_labels(function)
+    while eliminate_dead_code(function):
+        pass
+    reuse_temps(function)
+    return Report(str(function.id), before, len(function.instructions))
+
+def optimize(functions):
+    """ Optimizes every function in place and returns a Report of the
+    instruction counts before and after for each. """
+    return [optimize_function(x) for x in functions]
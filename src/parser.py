@@ -1,8 +1,9 @@
 ﻿#!/usr/bin/env python3
 from . import lexer
 from . import ast
-import contextlib
+from . import stats
 import functools
+import sys
 
 class ParseError(Exception):
     pass
@@ -10,10 +11,36 @@ class ParseError(Exception):
 class ParseFail(Exception):
     pass
 
+class Fail(object):
+    """ Returned by rules that do not match; only real errors raise. """
+    def __repr__(self):
+        return "FAIL"
+
+FAIL = Fail()
+
+class PackratCache(dict):
+    """ Maps (rule, position) to (result, end position), with a result of
+    FAIL recording that the rule failed at that position. """
+    def __init__(self):
+        super().__init__()
+        self.hits   = 0
+        self.misses = 0
+
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
 class TokenState(object):
-    def __init__(self, data):
-        self.tokens = [x for x in lexer.lex(data)]
+    def __init__(self, data, memo=None):
+        self.tokens = lexer.TokenBuffer(data)
+        self.types  = self.tokens.types
+        self.ids    = self.tokens.ids
+        self.memo   = memo
         self.pos = 0
+        # How many parsefunc rules are running on this state.
+        self.depth = 0
+        # One canonical leaf node per class and text for this parse.
+        self.leaves = {ast.Identifier : {}, ast.IntegerLiteral : {}, ast.Operation : {}}
 
     def __getitem__(self, index):
         try:
@@ -29,9 +56,37 @@ class TokenState(object):
         self.pos += 1
         return out
 
-    
+    def match(self, value):
+        """ Compares the current token against a TokenTypes or a string using
+        integer codes, only falling back to the token text for strings that
+        are not interned (e.g. type names). """
+        code = lexer.token_codes.get(value)
+        try:
+            if code is None:
+                return self.tokens.text(self.pos) == value
+            if code < lexer.ID_BASE:
+                return self.types[self.pos] == code
+            return self.ids[self.pos] == code
+        except IndexError:
+            return False
+
+    def text(self):
+        return self.tokens.text(self.pos)
+
+    def leaf(self, cls):
+        """ Consumes the current token, returning the shared `cls` node for
+        its text. Leaves are never mutated, so every occurrence of a name or
+        number can be the same object. """
+        text = self.tokens.text(self.pos)
+        self.pos += 1
+        nodes = self.leaves[cls]
+        out = nodes.get(text)
+        if out is None:
+            out = nodes[text] = cls(sys.intern(text))
+        return out
+
 def accept(tokens, value):
-    if tokens.peek() == value:
+    if tokens.match(value):
         return tokens.next()
     return None
 
@@ -39,99 +94,110 @@ def expect(tokens, value):
     out = accept(tokens, value)
     if out is not None:
         return out
-    raise ParseFail()
-
-@contextlib.contextmanager
-def parenthesis(tokens):
-    if not accept(tokens, "("):
-        raise ParseFail()
-    yield
-    expect(tokens, ")")
+    return FAIL
 
-@contextlib.contextmanager
-def braces(tokens):
-    if not accept(tokens, "{"):
-        raise ParseFail()
-    yield
-    expect(tokens, "}")
-
-@contextlib.contextmanager
-def error_on_fail(msg):
-    try:
-        yield
-    except ParseFail:
+def required(result, msg):
+    if result is FAIL or result is None:
         raise ParseError(msg)
+    return result
 
 def parse_any(tokens, *funcs):
     for f in funcs:
-        with contextlib.suppress(ParseFail):
-            return f(tokens)
-    raise ParseFail()
+        out = f(tokens)
+        if out is not FAIL:
+            return out
+    return FAIL
 
-depth = 0
 def parsefunc(function):
     @functools.wraps(function)
     def out(tokens, *args, **kwargs):
-        global depth
         pos = tokens.pos
-        depth += 1
+        memo = tokens.memo
+        if memo is not None and not args and not kwargs:
+            key = (function, pos)
+            entry = memo.get(key)
+            if entry is not None:
+                memo.hits += 1
+                result, tokens.pos = entry
+                return result
+            memo.misses += 1
+        else:
+            memo = None
+        tokens.depth += 1
         try:
             out = function(tokens, *args, **kwargs)
-            depth -= 1
-            return out
         except:
+            # Callers that catch a ParseError go on from where the rule began.
             tokens.pos = pos
-            depth -= 1
             raise
+        finally:
+            tokens.depth -= 1
+        if out is FAIL:
+            collected = stats.current() if tokens.pos != pos else None
+            if collected is not None:
+                collected.backtracks[function.__name__] += 1
+            tokens.pos = pos
+        if memo is not None:
+            memo[key] = (out, tokens.pos)
+        return out
     return out
 
 @parsefunc
 def identifier(tokens):
-    return ast.Identifier(str(expect(tokens, lexer.TokenTypes.IDENTIFIER)))
+    if not tokens.match(lexer.TokenTypes.IDENTIFIER):
+        return FAIL
+    return tokens.leaf(ast.Identifier)
 
 @parsefunc
 def literal(tokens):
-    return ast.IntegerLiteral(str(expect(tokens, lexer.TokenTypes.INT_LITERAL)))
+    if not tokens.match(lexer.TokenTypes.INT_LITERAL):
+        return FAIL
+    return tokens.leaf(ast.IntegerLiteral)
 
 @parsefunc
 def op(tokens):
-    return ast.Operation(str(expect(tokens, lexer.TokenTypes.BINOP)))
+    if not tokens.match(lexer.TokenTypes.BINOP):
+        return FAIL
+    return tokens.leaf(ast.Operation)
 
 @parsefunc
 def type_(tokens):
     if accept(tokens, "int"):
         return ast.Type("int")
-    raise ParseFail()
+    return FAIL
 
 @parsefunc
 def function_params(tokens):
     out = ast.FunctionParams()
     while True:
-        with contextlib.suppress(ParseFail):
-            temp = ast.Param()
-            temp.type = type_(tokens)
-            temp.id   = identifier(tokens)
-            out.append(temp)
+        temp = ast.Param()
+        temp.type = type_(tokens)
+        if temp.type is not FAIL:
+            temp.id = identifier(tokens)
+            if temp.id is not FAIL:
+                out.append(temp)
         if not accept(tokens, ","):
             break
     return out
 
 @parsefunc
 def return_(tokens):
-    expect(tokens, "return")
-    with error_on_fail("Could not parse return statement"):
-        out = ast.Return()
-        with contextlib.suppress(ParseFail):
-            out.expr = expression(tokens)
-        return out
+    if not accept(tokens, "return"):
+        return FAIL
+    out = ast.Return()
+    expr = expression(tokens)
+    if expr is not FAIL:
+        out.expr = expr
+    return out
 
 
 @parsefunc
 def expression_list(tokens):
     out = ast.ExpressionList()
     while True:
-        with contextlib.suppress(ParseFail):
-            out.append(expression(tokens))
+        expr = expression(tokens)
+        if expr is not FAIL:
+            out.append(expr)
         if not accept(tokens, ","):
             break
     return out
@@ -140,8 +206,11 @@ def expression_list(tokens):
 def func_call(tokens):
     out = ast.FuncCall()
     out.id = identifier(tokens)
-    with parenthesis(tokens):
-        out.exprs = expression_list(tokens)
+    if out.id is FAIL or not accept(tokens, "("):
+        return FAIL
+    out.exprs = expression_list(tokens)
+    if not accept(tokens, ")"):
+        return FAIL
     return out
 
 @parsefunc
@@ -150,109 +219,120 @@ def term(tokens):
 
 @parsefunc
 def expression(tokens):
-    queue = []
-    stack = []
-
-    with contextlib.suppress(ParseFail):
-        while True:
-            queue.append(term(tokens))
-            o1 = op(tokens)
-            o1_prec, o1_assoc = lexer.operations[o1.value]
-            while len(stack):
-                o2_prec, o2_assoc = lexer.operations[stack[-1].value]
-                if (o1_assoc == lexer.Associativity.LEFT and o1_prec <= o2_prec) or o1_prec < o2_prec:
-                    queue.append(stack.pop())
-                else:
-                    break
-            stack.append(o1)
-
-    queue += stack[::-1]
-    stack = []
-
-    try:
-        stack.append(queue.pop(0))
-        stack.append(queue.pop(0))
-        while len(queue) or len(stack) > 1:
-            if isinstance(queue[0], ast.Operation):
-                binop = ast.Binop(lhs=stack.pop(-2), rhs=stack.pop(-1), op=queue.pop(0))
-                stack.append(binop)
-            else:
-                stack.append(queue.pop(0))
-    except IndexError:
-        if len(stack) == 1 and not isinstance(stack[0], ast.Operation):
-            return stack.pop()
-        raise ParseFail()
-    return stack.pop()
+    return climb(tokens, 0)
+
+def climb(tokens, min_prec):
+    """ Precedence climbing over lexer.operations. Left associative
+    operators bind their right operand at one level higher, so the
+    recursion depth is bounded by the number of precedence levels and each
+    operator is visited once. """
+    lhs = term(tokens)
+    if lhs is FAIL:
+        return FAIL
+    while tokens.match(lexer.TokenTypes.BINOP):
+        prec, assoc = lexer.operations[tokens.text()]
+        if prec < min_prec:
+            break
+        o = op(tokens)
+        rhs = climb(tokens, prec + 1 if assoc == lexer.Associativity.LEFT else prec)
+        if rhs is FAIL:
+            return FAIL
+        lhs = ast.Binop(lhs=lhs, rhs=rhs, op=o)
+    return lhs
 
 @parsefunc
 def assign(tokens):
     id = identifier(tokens)
-    expect(tokens, ":=")
+    if id is FAIL or not accept(tokens, ":="):
+        return FAIL
     expr = expression(tokens)
+    if expr is FAIL:
+        return FAIL
     return ast.Assign(id, expr)
 
 @parsefunc
 def decl(tokens):
-    expect(tokens, "decl")
-    with error_on_fail("Error parsing decl"):
-        out = ast.Declare()
-        with parenthesis(tokens):
-            out.type_ = type_(tokens)
-        out.id = identifier(tokens)
-        expect(tokens, ":=");
-        out.initial_value = expression(tokens)
-        return out
+    if not accept(tokens, "decl"):
+        return FAIL
+    msg = "Error parsing decl"
+    out = ast.Declare()
+    required(accept(tokens, "("), msg)
+    out.type_ = required(type_(tokens), msg)
+    required(accept(tokens, ")"), msg)
+    out.id = required(identifier(tokens), msg)
+    required(accept(tokens, ":="), msg)
+    out.initial_value = required(expression(tokens), msg)
+    return out
 
 @parsefunc
 def else_(tokens):
-    expect(tokens, "else")
+    if not accept(tokens, "else"):
+        return FAIL
     return braced_stmt_list(tokens)
 
 @parsefunc
 def elif_(tokens):
-    expect(tokens, "elif")
+    if not accept(tokens, "elif"):
+        return FAIL
     out = ast.If()
-    with parenthesis(tokens):
-        out.cond = expression(tokens)
+    if not accept(tokens, "("):
+        return FAIL
+    out.cond = expression(tokens)
+    if out.cond is FAIL or not accept(tokens, ")"):
+        return FAIL
     out.true_branch = braced_stmt_list(tokens)
-    with contextlib.suppress(ParseFail):
-        out.false_branch = parse_any(tokens, else_, elif_)
+    if out.true_branch is FAIL:
+        return FAIL
+    false_branch = parse_any(tokens, else_, elif_)
+    if false_branch is not FAIL:
+        out.false_branch = false_branch
     return out
 
 @parsefunc
 def braced_stmt_list(tokens):
-    with braces(tokens):
-        return statement_list(tokens)
+    if not accept(tokens, "{"):
+        return FAIL
+    out = statement_list(tokens)
+    if not accept(tokens, "}"):
+        return FAIL
+    return out
 
 @parsefunc
 def if_(tokens):
-    expect(tokens, "if")
-    with error_on_fail("Could not parse if"):
-        out = ast.If()
-        with parenthesis(tokens):
-            out.cond = expression(tokens)
-        out.true_branch = braced_stmt_list(tokens)
-        with contextlib.suppress(ParseFail):
-            out.false_branch = parse_any(tokens, else_, elif_)
-        return out
+    if not accept(tokens, "if"):
+        return FAIL
+    msg = "Could not parse if"
+    out = ast.If()
+    required(accept(tokens, "("), msg)
+    out.cond = required(expression(tokens), msg)
+    required(accept(tokens, ")"), msg)
+    out.true_branch = required(braced_stmt_list(tokens), msg)
+    false_branch = parse_any(tokens, else_, elif_)
+    if false_branch is not FAIL:
+        out.false_branch = false_branch
+    return out
 
 @parsefunc
 def while_(tokens):
-    expect(tokens, "while")
-    with error_on_fail("Could not parse while"):
-        out = ast.While()
-        with parenthesis(tokens):
-            out.cond = expression(tokens)
-        out.statements = braced_stmt_list(tokens)
-        return out
+    if not accept(tokens, "while"):
+        return FAIL
+    msg = "Could not parse while"
+    out = ast.While()
+    required(accept(tokens, "("), msg)
+    out.cond = required(expression(tokens), msg)
+    required(accept(tokens, ")"), msg)
+    out.statements = required(braced_stmt_list(tokens), msg)
+    return out
 
 @parsefunc
 def statement(tokens):
     # statements that end in ";"
-    with contextlib.suppress(ParseFail):
-        out = parse_any(tokens, decl, return_, assign, expression)
-        expect(tokens, ";")
-        return out
+    pos = tokens.pos
+    out = parse_any(tokens, decl, return_, assign, expression)
+    if out is not FAIL:
+        if accept(tokens, ";"):
+            return out
+        tokens.pos = pos
     # statements that don't end in ";"
     return parse_any(tokens, if_, while_)
 
@@ -260,38 +340,58 @@ def statement(tokens):
 def statement_list(tokens):
     out = ast.StatementList()
     while True:
-        try:
-            out.append(statement(tokens))
-        except ParseFail:
+        stmt = statement(tokens)
+        if stmt is FAIL:
             break
+        out.append(stmt)
+    return out
+
+def function_header(tokens):
+    """ Parses everything of a function up to its body, returning an
+    ast.Function without statements. """
+    if not accept(tokens, "function"):
+        return FAIL
+    msg = "Could not parse function"
+    out = ast.Function()
+    out.id = required(identifier(tokens), msg)
+    required(accept(tokens, "("), msg)
+    out.params = function_params(tokens)
+    required(accept(tokens, ")"), msg)
+    if accept(tokens, "->"):
+        out.return_type = required(type_(tokens), msg)
     return out
 
 @parsefunc
 def function(tokens):
-    expect(tokens, "function")
-    with error_on_fail("Could not parse function"):
-        out = ast.Function()
-        out.id = identifier(tokens)
-        with parenthesis(tokens):
-            out.params = function_params(tokens)
-        if accept(tokens, "->"):
-            out.return_type = type_(tokens)
-        out.statements = braced_stmt_list(tokens)
-        return out
+    out = function_header(tokens)
+    if out is FAIL:
+        return FAIL
+    out.statements = required(braced_stmt_list(tokens), "Could not parse function")
+    return out
 
 @parsefunc
 def function_list(tokens):
     out = ast.FunctionList()
     while True:
-        try:
-            out.append(function(tokens))
-        except ParseFail:
+        func = function(tokens)
+        if func is FAIL:
             break
+        out.append(func)
     return out
 
-def parse(data, f = function_list):
-    tokens = TokenState(data)
-    out = f(tokens)
-    if not accept(tokens, lexer.TokenTypes.EOF):
+def parse(data, f = function_list, memoize = False):
+    """ Parses data with the rule f. memoize=True enables packrat parsing
+    for this call; passing a PackratCache instead also exposes its hit
+    statistics to the caller. """
+    if isinstance(memoize, PackratCache):
+        memo = memoize
+    else:
+        memo = PackratCache() if memoize else None
+    with stats.stage("lex"):
+        tokens = TokenState(data, memo)
+    stats.count("tokens", len(tokens.tokens))
+    with stats.stage("parse"):
+        out = f(tokens)
+    if out is FAIL or not accept(tokens, lexer.TokenTypes.EOF):
         raise ParseFail("Unexpected input.")
     return out
\ No newline at end of file
@@ -0,0 +1,276 @@
+﻿#!/usr/bin/env python3
+""" Compiles intermediate.Functions to Python functions.
+
+Each function becomes Python source. The IR the frontend emits is
+structured, so it is normally laid out as structured Python: a loop, the
+code from a label to the last jump back to it, becomes `while True` with
+the jumps back and out as `continue` and `break`, and a forward branch
+becomes `if` or `if`/`else`. Code that does not fit, or would nest deeper
+than CPython allows, is cut into blocks at the labels that are jumped to
+instead. Every block becomes a nested def that returns the block to run
+next, so a jump costs one call however many labels there are. Variables
+are renamed with a `v_` prefix and functions with `f_` so that source
+names cannot clash with Python keywords.
+"""
+from . import ast
+from . import intermediate
+
+binop_formats = {
+    "*"  : "{} * {}",
+    "/"  : "{} // {}",
+    "%"  : "{} % {}",
+    "+"  : "{} + {}",
+    "-"  : "{} - {}",
+    "<"  : "1 if {} < {} else 0",
+    "<=" : "1 if {} <= {} else 0",
+    ">"  : "1 if {} > {} else 0",
+    ">=" : "1 if {} >= {} else 0",
+    "==" : "1 if {} == {} else 0",
+    "!=" : "1 if {} != {} else 0",
+}
+
+def variable(value):
+    if value is None:
+        return "None"
+    if isinstance(value, ast.IntegerLiteral):
+        return str(int(value.value))
+    return "v_" + str(value)
+
+def function_name(value):
+    return "f_" + str(value)
+
+def statement(x):
+    """ Returns the Python source for an instruction other than a jump or a
+    Return. """
+    if isinstance(x, intermediate.Op):
+        expr = binop_formats[str(x.op)].format(variable(x.lhs), variable(x.rhs))
+        return "{} = {}".format(variable(x.result), expr)
+    if isinstance(x, intermediate.Assign):
+        return "{} = {}".format(variable(x.dest), variable(x.src))
+    if isinstance(x, intermediate.Call):
+        args = ", ".join(variable(y) for y in x.args)
+        return "{} = {}({})".format(variable(x.result), function_name(x.id), args)
+    raise NotImplementedError("For {}".format(type(x).__name__))
+
+def assigned(x):
+    if isinstance(x, (intermediate.Op, intermediate.Call)):
+        return x.result
+    if isinstance(x, intermediate.Assign):
+        return x.dest
+    return None
+
+def blocks(function):
+    """ Cuts function's instructions at the labels that are jumped to.
+    Returns the blocks as lists of instructions, and the index of the
+    block each such label starts. """
+    out = [[]]
+    starts = {}
+    for x in function.instructions:
+        if isinstance(x, intermediate.Label):
+            if x.references:
+                starts[id(x)] = len(out)
+                out.append([])
+        else:
+            out[-1].append(x)
+    return out, starts
+
+class Unstructured(Exception):
+    pass
+
+def finish(out, indent, line):
+    """ Appends line unless the statement before it at the same indent
+    already leaves the block. """
+    if not out[-1].startswith(tuple(indent + x for x in ("return", "continue", "break"))):
+        out.append(indent + line)
+
+# Below CPython's limits of 20 statically nested loops and 100 levels of
+# indentation.
+max_loops  = 18
+max_indent = 90
+
+class Structurer(object):
+    """ Lays out a function's instructions as structured Python, raising
+    Unstructured if they do not nest. """
+    def __init__(self, function):
+        self.code = []
+        self.position = {}
+        for x in function.instructions:
+            if isinstance(x, intermediate.Label):
+                self.position[id(x)] = len(self.code)
+            else:
+                self.code.append(x)
+        # The last instruction that jumps back to each loop header.
+        self.loops = {}
+        for k, x in enumerate(self.code):
+            label = getattr(x, "label", None)
+            if label is not None and self.position[id(label)] <= k:
+                self.loops[self.position[id(label)]] = k
+        self.out = []
+
+    def target(self, x):
+        return self.position[id(x.label)]
+
+    def control(self, target, loop):
+        """ Returns the statement for a jump to target from within loop, the
+        innermost (header, exit) being laid out, if it leaves or restarts
+        it. """
+        if loop is not None:
+            if target == loop[0]:
+                return "continue"
+            if target == loop[1]:
+                return "break"
+        return None
+
+    def block(self, start, stop, loop, depth, entered=None):
+        indent = "    " * depth
+        if depth > max_indent:
+            raise Unstructured()
+        first = len(self.out)
+        k = start
+        while k < stop:
+            if k in self.loops and k != entered:
+                end = self.loops[k]
+                if end >= stop:
+                    raise Unstructured()
+                self.out.append(indent + "while True:")
+                self.block(k, end + 1, (k, end + 1), depth + 1, k)
+                finish(self.out, indent + "    ", "break")
+                k = end + 1
+                continue
+            x = self.code[k]
+            if isinstance(x, intermediate.Jmp):
+                target = self.target(x)
+                jump = self.control(target, loop)
+                if jump is not None:
+                    self.out.append(indent + jump)
+                elif target != stop or k != stop - 1:
+                    raise Unstructured()
+                k += 1
+            elif isinstance(x, (intermediate.JmpNotIf, intermediate.JmpIf)):
+                target = self.target(x)
+                taken = "not " if isinstance(x, intermediate.JmpNotIf) else ""
+                jump = self.control(target, loop)
+                if jump is not None:
+                    self.out.append(indent + "if {}{}:".format(taken, variable(x.var)))
+                    self.out.append(indent + "    " + jump)
+                    k += 1
+                    continue
+                if not k < target <= stop:
+                    raise Unstructured()
+                skip = "" if taken else "not "
+                self.out.append(indent + "if {}{}:".format(skip, variable(x.var)))
+                last = self.code[target - 1] if target - 1 > k else None
+                if isinstance(last, intermediate.Jmp) and target < self.target(last) <= stop \
+                        and self.control(self.target(last), loop) is None:
+                    merge = self.target(last)
+                    self.block(k + 1, target - 1, loop, depth + 1)
+                    self.out.append(indent + "else:")
+                    self.block(target, merge, loop, depth + 1)
+                    k = merge
+                else:
+                    self.block(k + 1, target, loop, depth + 1)
+                    k = target
+            elif isinstance(x, intermediate.Return):
+                self.out.append(indent + "return {}".format(variable(x.var)))
+                k += 1
+            else:
+                self.out.append(indent + statement(x))
+                k += 1
+        if len(self.out) == first:
+            self.out.append(indent + "pass")
+
+    def lines(self):
+        self.nesting(0, len(self.code), 0)
+        self.block(0, len(self.code), None, 1)
+        finish(self.out, "    ", "return None")
+        return self.out
+
+    def nesting(self, start, stop, depth):
+        """ Checks that loops nest no deeper than max_loops. """
+        k = start
+        while k < stop:
+            if k in self.loops:
+                if depth >= max_loops:
+                    raise Unstructured()
+                self.nesting(k + 1, self.loops[k] + 1, depth + 1)
+                k = self.loops[k] + 1
+            else:
+                k += 1
+
+def generate_blocks(function, params):
+    """ Returns the source of function as one nested def per block. """
+    code, starts = blocks(function)
+    names = set()
+    for x in function.instructions:
+        name = assigned(x)
+        if name is not None:
+            names.add(variable(name))
+    names.difference_update(variable(x) for x in (function.params or ()))
+
+    out = ["def {}({}):".format(function_name(function.id), params)]
+    out.append("    _r = None")
+    for name in sorted(names):
+        out.append("    {} = None".format(name))
+    for i, block in enumerate(code):
+        stores = sorted(set(variable(assigned(x)) for x in block if assigned(x) is not None))
+        if any(isinstance(x, intermediate.Return) for x in block):
+            stores.append("_r")
+        out.append("    def _b{}():".format(i))
+        if stores:
+            out.append("        nonlocal {}".format(", ".join(stores)))
+        for x in block:
+            if isinstance(x, intermediate.Jmp):
+                out.append("        return _b{}".format(starts[id(x.label)]))
+            elif isinstance(x, (intermediate.JmpNotIf, intermediate.JmpIf)):
+                test = "not " if isinstance(x, intermediate.JmpNotIf) else ""
+                out.append("        if {}{}:".format(test, variable(x.var)))
+                out.append("            return _b{}".format(starts[id(x.label)]))
+            elif isinstance(x, intermediate.Return):
+                out.append("        _r = {}".format(variable(x.var)))
+                out.append("        return None")
+            else:
+                out.append("        " + statement(x))
+        finish(out, "        ", "return {}".format("_b{}".format(i + 1) if i + 1 < len(code) else "None"))
+    out.append("    _b = _b0")
+    out.append("    while _b is not None:")
+    out.append("        _b = _b()")
+    out.append("    return _r")
+    return out
+
+def generate(function, structured=True):
+    """ Returns the Python source of a def for function, as blocks if it
+    cannot be structured or structured is False. """
+    params = ", ".join(variable(x) for x in (function.params or ()))
+    try:
+        if not structured:
+            raise Unstructured()
+        out = ["def {}({}):".format(function_name(function.id), params)]
+        out += Structurer(function).lines()
+    except Unstructured:
+        out = generate_blocks(function, params)
+    return "\n".join(out) + "\n"
+
+class Module(object):
+    """ The Python functions compiled from an intermediate.FunctionList,
+    sharing one namespace so that they can call each other. Builtins are
+    Python callables available to the program by name. """
+    def __init__(self, functions=(), builtins=None):
+        self.namespace = {}
+        for name, func in (builtins or {}).items():
+            self.namespace[function_name(name)] = func
+        for x in functions:
+            self.load(x)
+
+    def load(self, function):
+        source = generate(function)
+        exec(compile(source, "<{}>".format(function.id), "exec"), self.namespace)
+        return self.namespace[function_name(function.id)]
+
+    def __getitem__(self, name):
+        return self.namespace[function_name(name)]
+
+    def call(self, name, *args):
+        return self[name](*args)
+
+def run(functions, name, *args, **kwargs):
+    return Module(functions, **kwargs).call(name, *args)
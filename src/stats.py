@@ -0,0 +1,89 @@
+﻿#!/usr/bin/env python3
+""" Compiler instrumentation.
+
+While a Stats object is active (see `collect`) the pipeline records the
+wall time of each stage, counts of tokens, AST nodes, IR instructions and
+symbol table lookups, and how often each parser rule failed after consuming
+tokens. When nothing is active every hook is a single `current() is None`
+test, so the hooks stay in place in normal builds.
+
+The active Stats is held in a ContextVar, so compilations on different
+threads (or asyncio tasks) each see only their own.
+"""
+import json
+import time
+from collections import Counter, OrderedDict
+from contextlib  import contextmanager
+from contextvars import ContextVar
+
+active = ContextVar("active", default=None)
+
+def current():
+    """ The active Stats in this context, or None. """
+    return active.get()
+
+class Stats(object):
+    def __init__(self):
+        self.times      = OrderedDict()
+        self.counts     = Counter()
+        self.backtracks = Counter()
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.times[name] = self.times.get(name, 0) + time.perf_counter() - start
+
+    def merge(self, other):
+        for name, seconds in other.times.items():
+            self.times[name] = self.times.get(name, 0) + seconds
+        self.counts.update(other.counts)
+        self.backtracks.update(other.backtracks)
+        return self
+
+    def as_dict(self):
+        return OrderedDict((
+            ("times",      OrderedDict(self.times)),
+            ("counts",     OrderedDict(sorted(self.counts.items()))),
+            ("backtracks", OrderedDict(self.backtracks.most_common())),
+        ))
+
+    def to_json(self, **kwargs):
+        return json.dumps(self.as_dict(), **kwargs)
+
+    def __repr__(self):
+        return "Stats({})".format(self.to_json())
+
+@contextmanager
+def collect(stats=None):
+    """ Makes stats, or a new Stats, the active one for the duration of the
+    with block. """
+    stats = stats if stats is not None else Stats()
+    token = active.set(stats)
+    try:
+        yield stats
+    finally:
+        active.reset(token)
+
+class NullStage(object):
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *args):
+        return False
+
+null_stage = NullStage()
+
+def stage(name):
+    """ Times a with block as stage `name` of the active Stats, if any. """
+    stats = active.get()
+    if stats is None:
+        return null_stage
+    return stats.stage(name)
+
+def count(name, n=1):
+    stats = active.get()
+    if stats is not None:
+        stats.counts[name] += n
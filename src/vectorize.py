@@ -0,0 +1,92 @@
+﻿#!/usr/bin/env python3
+""" Evaluates one expression over whole NumPy arrays.
+
+An expression is either an ast expression tree or the Op sequence it lowers
+to. Every Identifier is bound to an array, or a scalar, of input rows and
+each Op becomes a single ufunc call over all rows. Division and modulo
+floor as in the rest of the compiler, and comparisons give boolean arrays.
+NumPy is only imported the first time it is needed.
+"""
+from . import ast
+from . import intermediate
+
+ufunc_names = {
+    "*"  : "multiply",
+    "/"  : "floor_divide",
+    "%"  : "remainder",
+    "+"  : "add",
+    "-"  : "subtract",
+    "<"  : "less",
+    "<=" : "less_equal",
+    ">"  : "greater",
+    ">=" : "greater_equal",
+    "==" : "equal",
+    "!=" : "not_equal",
+}
+
+_numpy = None
+
+def numpy():
+    global _numpy
+    if _numpy is None:
+        import numpy
+        _numpy = numpy
+    return _numpy
+
+def integer(value):
+    """ Returns value as an integer array. Boolean results of comparisons
+    take part in arithmetic as 1 and 0, not with NumPy's logical rules. """
+    np = numpy()
+    value = np.asarray(value)
+    if value.dtype == np.bool_:
+        return value.astype(np.int64)
+    return value
+
+def apply(op, lhs, rhs):
+    np = numpy()
+    op = str(op)
+    lhs = integer(lhs)
+    rhs = integer(rhs)
+    if op in ("/", "%") and np.any(rhs == 0):
+        raise ZeroDivisionError("integer division or modulo by zero")
+    return getattr(np, ufunc_names[op])(lhs, rhs)
+
+def lower(node):
+    """ Returns the instructions computing the expression node and the
+    variable that holds its value. """
+    state = intermediate.TransformState()
+    instructions = node.to_intermediate(state)
+    return instructions, state.last_temp()
+
+def evaluate(expr, env, result=None):
+    """ Evaluates expr over the arrays in env, a mapping of variable name to
+    array. expr is an ast expression or a sequence of Op and Assign
+    instructions, in which case result names the variable to return and
+    defaults to the last one written. """
+    if isinstance(expr, ast.AST):
+        expr, result = lower(expr)
+    values = dict((str(k), v) for k, v in env.items())
+
+    def value(x):
+        if isinstance(x, ast.IntegerLiteral):
+            return int(x.value)
+        try:
+            return values[str(x)]
+        except KeyError:
+            raise NameError("No array bound to '{}'".format(x)) from None
+
+    last = None
+    for x in expr:
+        if isinstance(x, intermediate.Op):
+            values[str(x.result)] = apply(x.op, value(x.lhs), value(x.rhs))
+            last = x.result
+        elif isinstance(x, intermediate.Assign):
+            values[str(x.dest)] = value(x.src)
+            last = x.dest
+        else:
+            raise NotImplementedError("For {}".format(type(x).__name__))
+    if result is None:
+        result = last
+    if result is None:
+        raise ValueError("Nothing to evaluate")
+    return value(result)
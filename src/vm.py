@@ -0,0 +1,207 @@
+﻿#!/usr/bin/env python3
+from . import ast
+from . import intermediate
+
+# Opcodes. Every instruction is a tuple (opcode, a, b, c) of slot indices,
+# jump targets or call information, with one opcode per operator so the
+# dispatch loop never looks an operator up.
+MUL  = 0
+DIV  = 1
+MOD  = 2
+ADD  = 3
+SUB  = 4
+LT   = 5
+LE   = 6
+GT   = 7
+GE   = 8
+EQ   = 9
+NE   = 10
+MOVE = 11
+JMP  = 12
+JMPF = 13
+JMPT = 14
+CALL = 15
+RET  = 16
+
+binop_codes = {
+    "*"  : MUL,
+    "/"  : DIV,
+    "%"  : MOD,
+    "+"  : ADD,
+    "-"  : SUB,
+    "<"  : LT,
+    "<=" : LE,
+    ">"  : GT,
+    ">=" : GE,
+    "==" : EQ,
+    "!=" : NE,
+}
+
+class VMError(Exception):
+    pass
+
+class Code(object):
+    """ An intermediate.Function resolved for the VM: labels become
+    instruction indices and variables, temporaries and constants become
+    slots in a frame list. Parameters take the first slots and constants
+    are preloaded into the frame template. """
+    def __init__(self, function):
+        self.name     = str(function.id)
+        self.params   = [str(x) for x in (function.params or ())]
+        self.slots    = {}
+        self.template = []
+        self.code     = []
+        constants = {}
+        for x in self.params:
+            self.slot(x)
+
+        def operand(value):
+            if value is None:
+                return -1
+            if isinstance(value, ast.IntegerLiteral):
+                number = int(value.value)
+                if number not in constants:
+                    constants[number] = len(self.template)
+                    self.template.append(number)
+                return constants[number]
+            return self.slot(str(value))
+
+        targets = {}
+        pending = []
+        for x in function.instructions:
+            if isinstance(x, intermediate.Label):
+                targets[id(x)] = len(self.code)
+            elif isinstance(x, intermediate.Op):
+                self.code.append((binop_codes[str(x.op)], operand(x.result), operand(x.lhs), operand(x.rhs)))
+            elif isinstance(x, intermediate.Assign):
+                self.code.append((MOVE, operand(x.dest), operand(x.src), 0))
+            elif isinstance(x, intermediate.Jmp):
+                pending.append((len(self.code), x.label))
+                self.code.append((JMP, 0, 0, 0))
+            elif isinstance(x, intermediate.JmpNotIf):
+                pending.append((len(self.code), x.label))
+                self.code.append((JMPF, 0, operand(x.var), 0))
+            elif isinstance(x, intermediate.JmpIf):
+                pending.append((len(self.code), x.label))
+                self.code.append((JMPT, 0, operand(x.var), 0))
+            elif isinstance(x, intermediate.Call):
+                self.code.append((CALL, operand(x.result), str(x.id), tuple(operand(y) for y in x.args)))
+            elif isinstance(x, intermediate.Return):
+                self.code.append((RET, operand(x.var), 0, 0))
+            else:
+                raise VMError("Cannot execute {}".format(type(x).__name__))
+        self.code.append((RET, -1, 0, 0))
+        for i, label in pending:
+            op, _, b, c = self.code[i]
+            self.code[i] = (op, targets[id(label)], b, c)
+
+    def slot(self, name):
+        if name not in self.slots:
+            self.slots[name] = len(self.template)
+            self.template.append(None)
+        return self.slots[name]
+
+class VM(object):
+    """ Executes an intermediate.FunctionList. Calls push a frame on an
+    explicit stack rather than recursing in Python. Names that are not
+    compiled functions are looked up in `builtins`, a dict of Python
+    callables, and then passed to `loader`, which may return an
+    intermediate.Function to load for that name or None. """
+    def __init__(self, functions=(), builtins=None, loader=None):
+        self.codes    = {}
+        self.builtins = dict(builtins or {})
+        self.loader   = loader
+        for x in functions:
+            self.load(x)
+
+    def load(self, function):
+        code = Code(function)
+        self.codes[code.name] = code
+        return code
+
+    def call(self, name, *args):
+        code = self.lookup(name)
+        if callable(code):
+            return code(*args)
+        if len(args) != len(code.params):
+            raise VMError("Function '{}' takes {} arguments but {} were given".format(name, len(code.params), len(args)))
+        regs = list(code.template)
+        regs[:len(args)] = args
+        return self.execute(code, regs)
+
+    def lookup(self, name):
+        try:
+            return self.codes[name]
+        except KeyError:
+            pass
+        try:
+            return self.builtins[name]
+        except KeyError:
+            pass
+        function = self.loader(name) if self.loader is not None else None
+        if function is None:
+            raise VMError("Unknown function '{}'".format(name))
+        return self.load(function)
+
+    def execute(self, code, regs):
+        stack = []
+        instrs = code.code
+        pc = 0
+        while True:
+            op, a, b, c = instrs[pc]
+            pc += 1
+            if op == MOVE:
+                regs[a] = regs[b]
+            elif op == ADD:
+                regs[a] = regs[b] + regs[c]
+            elif op == SUB:
+                regs[a] = regs[b] - regs[c]
+            elif op == LT:
+                regs[a] = int(regs[b] < regs[c])
+            elif op == JMPF:
+                if not regs[b]:
+                    pc = a
+            elif op == JMP:
+                pc = a
+            elif op == MUL:
+                regs[a] = regs[b] * regs[c]
+            elif op == DIV:
+                regs[a] = regs[b] // regs[c]
+            elif op == MOD:
+                regs[a] = regs[b] % regs[c]
+            elif op == LE:
+                regs[a] = int(regs[b] <= regs[c])
+            elif op == GT:
+                regs[a] = int(regs[b] > regs[c])
+            elif op == GE:
+                regs[a] = int(regs[b] >= regs[c])
+            elif op == EQ:
+                regs[a] = int(regs[b] == regs[c])
+            elif op == NE:
+                regs[a] = int(regs[b] != regs[c])
+            elif op == JMPT:
+                if regs[b]:
+                    pc = a
+            elif op == CALL:
+                callee = self.lookup(b)
+                if callable(callee):
+                    regs[a] = callee(*[regs[x] for x in c])
+                    continue
+                if len(c) != len(callee.params):
+                    raise VMError("Function '{}' takes {} arguments but {} were given".format(b, len(callee.params), len(c)))
+                frame = list(callee.template)
+                for i, x in enumerate(c):
+                    frame[i] = regs[x]
+                stack.append((instrs, regs, pc, a))
+                instrs = callee.code
+                regs = frame
+                pc = 0
+            elif op == RET:
+                value = regs[a] if a >= 0 else None
+                if not stack:
+                    return value
+                instrs, regs, pc, result = stack.pop()
+                regs[result] = value
+
+def run(functions, name, *args, **kwargs):
+    return VM(functions, **kwargs).call(name, *args)
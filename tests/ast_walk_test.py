@@ -0,0 +1,37 @@
+﻿import unittest
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from src import parser
+from src import ast
+from src import intermediate
+
+class Test_ast_walk(unittest.TestCase):
+    def test_long_expression_0(self):
+        count = 20000
+        expr = parser.parse(" + ".join(["1"] * count), parser.expression)
+        self.assertEqual(expr.check_semantics(ast.SymbolTable()).value, "int")
+        instructions = expr.to_intermediate(intermediate.TransformState())
+        self.assertEqual(len(instructions), count - 1)
+        self.assertEqual(expr.print().count("("), count - 1)
+
+    def test_deep_if_0(self):
+        depth = 3000
+        body = ast.StatementList()
+        for _ in range(depth):
+            stmt = ast.If(cond=ast.Identifier("x"), true_branch=body)
+            body = ast.StatementList()
+            body.append(stmt)
+        func = ast.Function(id=ast.Identifier("f"), params=ast.FunctionParams(), statements=body)
+        func.statements.insert(0, parser.parse("decl(int) x := 1", parser.decl))
+        func.check_semantics(ast.SymbolTable())
+        out = func.to_intermediate(intermediate.TransformState())
+        self.assertEqual(sum(isinstance(x, intermediate.Label) for x in out.instructions), 2 * depth)
+
+    def test_print_0(self):
+        expr = parser.parse("1 + 2 * a - b", parser.expression)
+        self.assertEqual(expr.print(), "((1 + (2 * a)) - b)")
+
+if __name__ == '__main__':
+    unittest.main()
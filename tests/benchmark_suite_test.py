@@ -0,0 +1,53 @@
+﻿import unittest
+import sys
+import os
+import json
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from src import driver
+from benchmarks import generators
+from benchmarks import suite
+
+class Test_benchmark_suite(unittest.TestCase):
+    def test_generators_0(self):
+        for name, (generate, sizes) in generators.shapes.items():
+            for size in (1, 2, sizes[0]):
+                driver.compile_source(generate(size))
+
+    def test_run_0(self):
+        out = suite.run(["decls"], repeat=1)
+        self.assertEqual(list(out["results"]), ["decls"])
+        for times in out["results"]["decls"].values():
+            self.assertEqual(tuple(times), suite.stages)
+
+    def test_compare_0(self):
+        def results(parse):
+            return {"results" : {"decls" : {"10" : {"lex" : 0.01, "parse" : parse, "check" : 0.0001}}}}
+        baseline = results(0.01)
+        self.assertEqual(suite.compare(baseline, results(0.012)), [])
+        self.assertEqual(suite.compare(baseline, results(0.02)), [("decls", "10", "parse", 0.01, 0.02)])
+        self.assertEqual(suite.compare(baseline, results(0.02), threshold=1.5), [])
+        # Stages under min_time in the baseline are not compared.
+        slow = results(0.01)
+        slow["results"]["decls"]["10"]["check"] = 0.1
+        self.assertEqual(suite.compare(baseline, slow), [])
+
+    def test_calibration_0(self):
+        baseline = {"calibration" : 0.1, "results" : {"decls" : {"10" : {"parse" : 0.01}}}}
+        current = {"calibration" : 0.2, "results" : {"decls" : {"10" : {"parse" : 0.018}}}}
+        # Twice as slow a machine is allowed twice the time.
+        self.assertEqual(suite.compare(baseline, current), [])
+        current["calibration"] = 0.1
+        self.assertEqual(suite.compare(baseline, current), [("decls", "10", "parse", 0.01, 0.018)])
+
+    def test_baseline_0(self):
+        # A fresh checkout has a baseline covering every shape to compare
+        # against.
+        with open(suite.default_baseline) as fp:
+            baseline = json.load(fp)
+        self.assertIn("calibration", baseline)
+        for name, (generate, sizes) in generators.shapes.items():
+            self.assertEqual(list(baseline["results"][name]), [str(x) for x in sizes])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -50,6 +50,12 @@ class Test_binop_eval_test(ParserTestCase):
     def test_3(self):
          self.assertEvalsTo("1 + 2 - 3 * 4", "-9")
 
+    def test_4(self):
+        self.assertEvalsTo("10 - 4 - 3", "3")
+
+    def test_5(self):
+        self.assertEvalsTo("100 / 10 / 5 + 2 * 3 < 9 == 1", "True")
+
     def test_random_expression_0(self):
         expr, result = random_expression(operations = ["+", "-", "*", "/"])
         self.assertEvalsTo(expr, result)
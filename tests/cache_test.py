@@ -0,0 +1,96 @@
+﻿import unittest
+import sys
+import os
+import time
+import tempfile
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from src import cache
+from src import driver
+
+source = b"function add(int a, int b) -> int { return a + b; }"
+
+class Test_cache(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_round_trip_0(self):
+        c = cache.CompileCache(self.dir.name)
+        key = c.key(source)
+        self.assertIsNone(c.get(key))
+        functions = driver.compile_source(source.decode())
+        c.put(key, functions)
+        loaded = c.get(key)
+        self.assertEqual(driver.format_ir(loaded), driver.format_ir(functions))
+        self.assertEqual((c.hits, c.misses), (1, 1))
+
+    def test_truncated_0(self):
+        c = cache.CompileCache(self.dir.name)
+        c.put("a", driver.compile_source(source.decode()))
+        with open(c.entry("a"), "r+b") as fp:
+            fp.truncate(os.path.getsize(c.entry("a")) - 1)
+        self.assertIsNone(c.get("a"))
+        self.assertEqual(c.misses, 1)
+
+    def test_key_0(self):
+        c = cache.CompileCache(self.dir.name)
+        self.assertEqual(c.key(source), c.key(source))
+        self.assertNotEqual(c.key(source), c.key(source + b" "))
+
+    def test_eviction_0(self):
+        functions = driver.compile_source(source.decode())
+        c = cache.CompileCache(self.dir.name)
+        c.put("a", functions)
+        os.utime(c.entry("a"), (time.time() - 10, time.time() - 10))
+        c.max_size = os.path.getsize(c.entry("a")) + 1
+        c.put("b", functions)
+        self.assertIsNone(c.get("a"))
+        self.assertIsNotNone(c.get("b"))
+
+    def test_low_water_0(self):
+        functions = driver.compile_source(source.decode())
+        c = cache.CompileCache(self.dir.name)
+        c.put("a", functions)
+        size = c.size
+        c.max_size = size * 10
+        scans = []
+        evict = c.evict
+        c.evict = lambda **kwargs: (scans.append(1), evict(**kwargs))
+        for i in range(40):
+            c.put(str(i), functions)
+        # Only puts that cross max_size scan, and each scan frees down to
+        # low_water so the following puts don't.
+        self.assertLess(len(scans), 10)
+        on_disk = sum(x[1] for x in c.entries())
+        self.assertEqual(c.size, on_disk)
+        self.assertLessEqual(on_disk, c.max_size)
+        self.assertIsNotNone(c.get("39"))
+        # A reopened cache starts from the size on disk.
+        self.assertEqual(cache.CompileCache(self.dir.name).size, on_disk)
+
+    def test_version_0(self):
+        c = cache.CompileCache(self.dir.name)
+        key = c.key(source)
+        saved = cache.irformat.VERSION, cache._version
+        try:
+            cache.irformat.VERSION += 1
+            cache._version = None
+            self.assertNotEqual(c.key(source), key)
+        finally:
+            cache.irformat.VERSION, cache._version = saved
+
+    def test_driver_0(self):
+        path = os.path.join(self.dir.name, "add.x")
+        with open(path, "wb") as fp:
+            fp.write(source)
+        cache_dir = os.path.join(self.dir.name, "cache")
+        first  = driver.compile_file(path, cache_dir)
+        second = driver.compile_file(path, cache_dir)
+        self.assertEqual(first, second)
+        self.assertEqual(len(os.listdir(cache_dir)), 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+﻿import unittest
+import sys
+import os
+import time
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from src import cfg
+from src import driver
+
+program = """
+function a()
+{
+    decl(int) x := 0;
+    while(x < 10)
+    {
+        while(x < 5)
+        {
+            x := x + 1;
+        }
+        if(x < 3)
+        {
+            return;
+        }
+        x := x + 2;
+    }
+    return;
+    x := 1;
+}
+"""
+
+def build(data):
+    return cfg.build(driver.compile_source(data)[0])
+
+class Test_cfg(unittest.TestCase):
+    def test_blocks_0(self):
+        graph = build(program)
+        self.assertEqual([str(x) for x in graph.blocks[1].instructions], ["L0:", "_t0 <- x < 10", "Jmp !_t0 L1:"])
+        for block in graph.blocks:
+            for succ in block.successors:
+                self.assertIn(block, succ.predecessors)
+
+    def test_edges_0(self):
+        graph = build(program)
+        outer = graph.blocks[1]
+        self.assertEqual(len(outer.successors), 2)
+        self.assertEqual(len(outer.predecessors), 2)
+        self.assertEqual(graph.blocks[-1].predecessors, [])
+        self.assertFalse(graph.reachable(graph.blocks[-1]))
+
+    def test_dominators_0(self):
+        graph = build(program)
+        entry, outer, inner = graph.blocks[0], graph.blocks[1], graph.blocks[2]
+        for block in graph.blocks:
+            if graph.reachable(block):
+                self.assertTrue(graph.dominates(entry, block))
+        self.assertTrue(graph.dominates(outer, inner))
+        self.assertFalse(graph.dominates(inner, outer))
+
+    def test_loops_0(self):
+        graph = build(program)
+        self.assertEqual(len(graph.loops), 2)
+        inner, outer = graph.loops
+        self.assertIs(inner.parent, outer)
+        self.assertEqual((inner.depth, outer.depth), (2, 1))
+        self.assertEqual([x.loop_depth for x in graph.blocks[:4]], [0, 1, 2, 2])
+
+    def test_large_0(self):
+        def loops(count):
+            body = "".join("if(x < {0}) {{ x := x + {0}; }} while(x > {0}) {{ x := x - 1; }}".format(i) for i in range(count))
+            graph = build("function a() { decl(int) x := 0; " + body + " }")
+            self.assertEqual(len(graph.loops), count)
+            best = None
+            for _ in range(3):
+                start = time.perf_counter()
+                graph.find_loops()
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+            return best
+        # Four times the loops takes about four times as long, where a
+        # quadratic nesting step would take sixteen.
+        small, large = loops(1000), loops(4000)
+        self.assertLess(large / small, 10)
+
+    def test_nesting_0(self):
+        depth = 30
+        body = "x := x + 1;"
+        for i in range(depth):
+            body = "while(x < {}) {{ {} }}".format(i, body)
+        graph = build("function a() { decl(int) x := 0; " + body + " }")
+        self.assertEqual(sorted(x.depth for x in graph.loops), list(range(1, depth + 1)))
+        for x in graph.loops:
+            if x.depth > 1:
+                self.assertEqual(x.parent.depth, x.depth - 1)
+                self.assertIn(x.header, x.parent.blocks)
+
+if __name__ == '__main__':
+    unittest.main()
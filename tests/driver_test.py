@@ -0,0 +1,103 @@
+﻿import unittest
+import sys
+import os
+import io
+import tempfile
+from contextlib import redirect_stderr
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+import compiler
+from src import ast
+from src import driver
+from src import intermediate
+from src import stats
+from benchmarks import generators
+
+class Test_driver(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.paths = []
+        for i in range(6):
+            path = os.path.join(self.dir.name, "f{}.x".format(i))
+            with open(path, "w") as fp:
+                fp.write("function f{0}(int a) -> int {{ return a + {0}; }}".format(i))
+            self.paths.append(path)
+        self.bad = os.path.join(self.dir.name, "bad.x")
+        with open(self.bad, "w") as fp:
+            fp.write("function g() -> int { return y; }")
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_order_0(self):
+        serial   = driver.compile_files(self.paths)
+        parallel = driver.compile_files(self.paths, jobs=3)
+        self.assertEqual(serial, parallel)
+        self.assertEqual([x.output.split("\n")[0] for x in parallel], ["function f{}".format(i) for i in range(6)])
+
+    def test_error_0(self):
+        results = driver.compile_files([self.paths[0], self.bad, self.paths[1]], jobs=2)
+        self.assertEqual([x.error is None for x in results], [True, False, True])
+        self.assertIn("'y'", results[1].error)
+
+    def test_bad_input_0(self):
+        # Undecodable and too deeply nested files are reported per file and
+        # the rest still compile, with or without worker processes.
+        binary = os.path.join(self.dir.name, "binary.x")
+        with open(binary, "wb") as fp:
+            fp.write(b"function f() { }\xff\xfe")
+        deep = os.path.join(self.dir.name, "deep.x")
+        with open(deep, "w") as fp:
+            fp.write("function f(int a) {" + "if(a) {" * 1000 + "}" * 1000 + "}")
+        for jobs in (1, 2):
+            results = driver.compile_files([binary, self.paths[0], deep], jobs=jobs)
+            self.assertEqual([x.error is None for x in results], [False, True, False])
+            self.assertTrue(results[0].error.startswith("UnicodeDecodeError"))
+            self.assertTrue(results[2].error.startswith("RecursionError"))
+
+    def test_parallel_source_0(self):
+        source = generators.many_functions(40)
+        self.assertEqual(driver.format_ir(driver.compile_source(source, jobs=2)),
+                         driver.format_ir(driver.compile_source(source)))
+        with self.assertRaises(ast.UnresolvedNames) as error:
+            driver.compile_source(source + "function g() -> int { return y; }", jobs=2)
+        self.assertEqual(error.exception.names, ["y"])
+
+    def test_parallel_stats_0(self):
+        source = generators.many_functions(40)
+        with stats.collect() as serial:
+            driver.compile_source(source)
+        with stats.collect() as parallel:
+            driver.compile_source(source, jobs=2)
+        for name in ("lex", "parse", "check", "lower"):
+            self.assertIn(name, parallel.times)
+        for name in ("symbol_lookups", "ir_instructions"):
+            self.assertEqual(parallel.counts[name], serial.counts[name])
+        # Each chunk lexes its own EOF and the serial walk also visits the
+        # FunctionList, so these only come close.
+        for name in ("tokens", "ast_nodes_check_semantics", "ast_nodes_to_intermediate"):
+            self.assertAlmostEqual(parallel.counts[name], serial.counts[name], delta=10)
+
+    def test_merge_0(self):
+        state = intermediate.TransformState()
+        first = intermediate.TransformState()
+        second = intermediate.TransformState()
+        temps = [second.temp(), second.temp(), first.temp()]
+        labels = [second.label(), first.label()]
+        state.merge(first.temps, first.labels)
+        state.merge(second.temps, second.labels)
+        self.assertEqual([str(x) for x in temps], ["_t1", "_t2", "_t0"])
+        self.assertEqual([x.idx for x in labels], [1, 0])
+
+    def test_main_0(self):
+        output = os.path.join(self.dir.name, "out.ir")
+        stderr = io.StringIO()
+        with redirect_stderr(stderr):
+            status = compiler.main(["-j", "2", "-o", output, self.bad] + self.paths)
+        self.assertEqual(status, 1)
+        self.assertIn("bad.x", stderr.getvalue())
+        with open(output) as fp:
+            self.assertEqual(fp.read().count("function"), 6)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+﻿import unittest
+import sys
+import os
+import random
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from src import parser
+from src import driver
+from src import intermediate
+from src import incremental
+
+def dump(functions):
+    return driver.format_ir(functions.to_intermediate(intermediate.TransformState()))
+
+program = """function f(int a) -> int
+{
+    return a;
+}
+
+function g(int x) -> int
+{
+    while(x < 10)
+    {
+        x := x + 1;
+    }
+    return x;
+}
+
+function h()
+{
+}
+"""
+
+class Test_incremental(unittest.TestCase):
+    def setUp(self):
+        self.result = incremental.parse(program)
+
+    def assertMatchesFullParse(self, result):
+        expected = parser.parse(result.text)
+        self.assertEqual(dump(result.functions), dump(expected))
+        for func, (start, end) in zip(result.functions, result.spans):
+            text = result.text[start:end]
+            self.assertTrue(text.startswith("function") and text.endswith("}"))
+            self.assertEqual(len(parser.parse(text)), 1)
+
+    def test_spans_0(self):
+        self.assertEqual(len(self.result.spans), 3)
+        self.assertMatchesFullParse(self.result)
+
+    def test_reuse_0(self):
+        offset = program.index("x + 1")
+        out = self.result.edit(offset, 5, "x * 2 + 1")
+        self.assertMatchesFullParse(out)
+        self.assertIs(out.functions[0], self.result.functions[0])
+        self.assertIsNot(out.functions[1], self.result.functions[1])
+        self.assertIs(out.functions[2], self.result.functions[2])
+
+    def test_insert_function_0(self):
+        offset = program.index("function g")
+        out = self.result.edit(offset, 0, "function k() { }\n")
+        self.assertEqual(len(out.functions), 4)
+        self.assertMatchesFullParse(out)
+        self.assertIs(out.functions[0], self.result.functions[0])
+        self.assertIs(out.functions[3], self.result.functions[2])
+
+    def test_remove_function_0(self):
+        start, end = self.result.spans[1]
+        out = self.result.edit(start, end - start, "")
+        self.assertEqual(len(out.functions), 2)
+        self.assertMatchesFullParse(out)
+
+    def test_merge_0(self):
+        # Deleting from inside f to inside g leaves a single function.
+        start = program.index("return a;")
+        end = program.index("while")
+        out = self.result.edit(start, end - start, "")
+        self.assertEqual(len(out.functions), 2)
+        self.assertMatchesFullParse(out)
+
+    def test_error_0(self):
+        with self.assertRaises(incremental.errors):
+            self.result.edit(program.index("x + 1"), 0, "decl ")
+        with self.assertRaises(incremental.errors):
+            self.result.edit(program.index("function h"), 0, "}")
+
+    def test_sequence_0(self):
+        random.seed(0)
+        result = self.result
+        for _ in range(100):
+            start, end = random.choice(result.spans)
+            body = result.text.index("{", start) + 1
+            out = result.edit(body, 0, " decl(int) y{} := {};".format(random.randint(0, 9), random.randint(0, 99)))
+            self.assertMatchesFullParse(out)
+            result = out
+        self.assertEqual(result.text.count("decl"), 100)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+﻿import unittest
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from src import ast
+from src import interactive
+
+class Test_interactive(unittest.TestCase):
+    def setUp(self):
+        self.session = interactive.Session()
+
+    def results(self, text):
+        return self.session.submit(text)[1]
+
+    def test_variables_0(self):
+        self.assertEqual(self.results("decl(int) x := 4;"), [])
+        self.assertEqual(self.results("x := x * 3; x + 1;"), [13])
+        self.assertEqual(self.results("while(x > 5) { x := x - 5; } x;"), [2])
+
+    def test_functions_0(self):
+        self.results("function sq(int a) -> int { return a * a; }")
+        self.assertEqual(self.results("sq(7);"), [49])
+        # Earlier definitions are not compiled again.
+        code = self.session.vm.codes["sq"]
+        self.results("function twice(int a) -> int { return sq(a) + sq(a); }")
+        self.assertIs(self.session.vm.codes["sq"], code)
+        self.assertEqual(self.results("twice(3);"), [18])
+
+    def test_redefine_0(self):
+        self.results("function f() -> int { return 1; }")
+        self.results("function f() -> int { return 2; }")
+        self.assertEqual(self.results("f();"), [2])
+
+    def test_shadowing_0(self):
+        self.results("decl(int) x := 1;")
+        self.assertEqual(self.results("if(x > 0) { decl(int) x := 5; x := x * 2; } x;"), [1])
+        self.results("function f() -> int { decl(int) y := 1; if(y > 0) { decl(int) y := 9; } return y; }")
+        self.assertEqual(self.results("f();"), [1])
+
+    def test_builtins_0(self):
+        out = []
+        session = interactive.Session(builtins={
+            "function log(int x)" : out.append,
+            "function twice(int x) -> int" : lambda x: x * 2,
+        })
+        session.submit("decl(int) x := 6; log(x * 7);")
+        session.submit("function f(int a) { log(a + 1); } f(1);")
+        self.assertEqual(out, [42, 2])
+        self.assertEqual(session.submit("twice(x) + 1;")[1], [13])
+        # log is void and takes one int, like a user function declared so.
+        for text in ("log(1) + 1;", "x := log(1);", "log(1, 2);", "log();", "twice(log(1));"):
+            with self.assertRaises(ast.SemanticsException):
+                session.submit(text)
+        self.assertEqual(out, [42, 2])
+
+    def test_errors_0(self):
+        self.results("decl(int) x := 1;")
+        with self.assertRaises(ast.SemanticsException):
+            self.results("decl(int) y := z;")
+        with self.assertRaises(ZeroDivisionError):
+            self.results("decl(int) w := x / 0;")
+        # Neither failed declaration is left behind, so both can be retried.
+        self.assertEqual(self.results("decl(int) y := 2; decl(int) w := 3; x + y + w;"), [6])
+
+    def test_function_scope_0(self):
+        # Functions cannot see session variables, and a function that fails
+        # its check is not defined.
+        self.results("decl(int) x := 1;")
+        with self.assertRaises(ast.SemanticsException):
+            self.results("function f() -> int { return x; }")
+        with self.assertRaises(ast.SemanticsException):
+            self.results("f();")
+        self.assertEqual(self.results("x;"), [1])
+
+    def test_ir_0(self):
+        functions, results = self.session.submit("function f(int a) -> int { return a; } f(1);")
+        self.assertEqual([str(x) for x in functions], ["function f", "function <input 1>"])
+        self.assertEqual(list(self.session.timings), ["parse", "check", "lower", "run"])
+
+    def test_complete_0(self):
+        self.assertFalse(interactive.complete("function f()\n{\n"))
+        self.assertFalse(interactive.complete("decl(int) x := 1"))
+        self.assertTrue(interactive.complete("function f()\n{\n}\n"))
+        self.assertTrue(interactive.complete("x := 1;"))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+﻿import unittest
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from src import ast
+from src import driver
+from src import parser
+
+program = """
+function f(int a) -> int
+{
+    decl(int) b := a + 1;
+    while(b < 10)
+    {
+        b := b + a * 1;
+    }
+    return b + f(b);
+}
+"""
+
+def leaves(node, out):
+    if isinstance(node, ast.ValueType):
+        out.append(node)
+    elif isinstance(node, list):
+        for x in node:
+            leaves(x, out)
+    elif isinstance(node, ast.AST):
+        for name in type(node).__slots__:
+            leaves(getattr(node, name), out)
+    return out
+
+class Test_interning(unittest.TestCase):
+    def test_shared_0(self):
+        tree = parser.parse(program)
+        by_value = {}
+        for x in leaves(tree, []):
+            if isinstance(x, ast.Type):
+                continue
+            by_value.setdefault((type(x), x.value), set()).add(id(x))
+        self.assertEqual(len(by_value[(ast.Identifier, "b")]), 1)
+        self.assertEqual(len(by_value[(ast.IntegerLiteral, "1")]), 1)
+        self.assertEqual(len(by_value[(ast.Operation, "+")]), 1)
+        self.assertTrue(all(len(x) == 1 for x in by_value.values()))
+
+    def test_per_parse_0(self):
+        # Nodes are shared within one parse but not between parses.
+        a = parser.parse("function f(int x) -> int { return x; }")
+        b = parser.parse("function f(int x) -> int { return x; }")
+        self.assertIs(a[0].id, a[0].id)
+        self.assertIsNot(a[0].id, b[0].id)
+        self.assertEqual(str(a[0].id), str(b[0].id))
+
+    def test_slots_0(self):
+        nodes = (ast.Identifier("x"), ast.IntegerLiteral("1"), ast.Operation("+"), ast.Binop(),
+                 ast.Function(), ast.If(), ast.While(), ast.StatementList())
+        for x in nodes:
+            self.assertFalse(hasattr(x, "__dict__"), type(x).__name__)
+
+    def test_symbols_0(self):
+        table = ast.SymbolTable()
+        table[ast.Identifier("x")] = 1
+        self.assertEqual(table["x"], 1)
+        self.assertEqual(table[ast.Identifier("x")], 1)
+
+    def test_lowering_0(self):
+        # Lowering and temp renumbering never change a shared leaf.
+        functions = driver.compile_source(program + program.replace("f(", "g("))
+        self.assertIn("b <- _t", driver.format_ir(functions))
+
+if __name__ == '__main__':
+    unittest.main()
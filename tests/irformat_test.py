@@ -0,0 +1,99 @@
+﻿import unittest
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from src import ast
+from src import driver
+from src import irformat
+from src import intermediate
+
+program = """
+function a()
+{
+    decl(int) x := 10;
+    if(x < 10)
+    {
+        return;
+    }
+    elif(x >= 10)
+    {}
+    else
+    {}
+    while(x < 10)
+    {
+        x := x + 1 * 300;
+    }
+}
+
+function add(int a, int b) -> int
+{
+    return a + b % 7;
+}
+"""
+
+class Test_irformat(unittest.TestCase):
+    def assertRoundTrips(self, functions):
+        data = irformat.dumps(functions)
+        self.assertEqual(driver.format_ir(irformat.loads(data)), driver.format_ir(functions))
+        return data
+
+    def test_round_trip_0(self):
+        self.assertRoundTrips(driver.compile_source(program))
+
+    def test_round_trip_call_0(self):
+        functions = driver.compile_source("function g(int a, int b) -> int { return a; } function f() -> int { return g(1, g(2, 3)); }")
+        data = self.assertRoundTrips(functions)
+        self.assertEqual([str(x) for x in irformat.loads(data)[0].params], ["a", "b"])
+
+    def test_round_trip_empty_0(self):
+        self.assertRoundTrips(intermediate.FunctionList())
+
+    def test_labels_0(self):
+        functions = irformat.loads(irformat.dumps(driver.compile_source(program)))
+        labels = [x for x in functions[0].instructions if isinstance(x, intermediate.Label)]
+        jumps  = [x for x in functions[0].instructions if isinstance(x, (intermediate.Jmp, intermediate.JmpNotIf))]
+        self.assertEqual(sum(len(x.references) for x in labels), len(jumps))
+        for x in jumps:
+            self.assertIn(x.label, labels)
+
+    def test_negative_literal_0(self):
+        function = intermediate.Function(ast.Identifier("f"))
+        function.instructions += intermediate.Assign(ast.Identifier("x"), ast.IntegerLiteral("-12345678901234567890"))
+        functions = intermediate.FunctionList()
+        functions.append(function)
+        self.assertRoundTrips(functions)
+
+    def test_lazy_0(self):
+        reader = irformat.Reader(irformat.dumps(driver.compile_source(program)))
+        self.assertEqual(reader.names(), ["a", "add"])
+        self.assertEqual(reader.functions, [None, None])
+        self.assertEqual(str(reader[1]), "function add")
+        self.assertIsNone(reader.functions[0])
+
+    def test_bad_magic_0(self):
+        with self.assertRaises(irformat.FormatError):
+            irformat.loads(b"nope")
+
+    def test_truncated_0(self):
+        data = irformat.dumps(driver.compile_source(program))
+        for size in range(len(data)):
+            with self.assertRaises(irformat.FormatError):
+                irformat.loads(data[:size])
+
+    def test_bad_operator_0(self):
+        data = bytearray(irformat.dumps(driver.compile_source("function f(int a) -> int { return a + 1; }")))
+        pos = data.rindex(bytes([irformat.OP, irformat.operator_id["+"]]))
+        data[pos + 1] = 0xff
+        reader = irformat.Reader(bytes(data))
+        with self.assertRaises(irformat.FormatError):
+            reader[0]
+
+    def test_varint_0(self):
+        for value in (0, 1, 127, 128, 300, 1 << 40):
+            out = bytearray()
+            irformat.write_varint(out, value)
+            self.assertEqual(irformat.read_varint(out, 0), (value, len(out)))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+﻿import unittest
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from src import ast
+from src import driver
+from src import lazy
+from src import parser
+from src import vm
+from tests.vm_test import program
+
+class Test_lazy(unittest.TestCase):
+    def setUp(self):
+        self.source = "function log(int x) {}" + program
+        self.module = lazy.Module(self.source)
+
+    def test_index_0(self):
+        self.assertEqual([repr(x) for x in self.module.entries.values()],
+            ["log(int x)", "fib(int n) -> int", "count(int n) -> int", "sum(int n) -> int", "report(int x)"])
+        self.assertEqual(self.module.compiled(), [])
+
+    def test_on_demand_0(self):
+        machine = self.module.vm()
+        self.assertEqual(machine.call("fib", 15), 610)
+        self.assertEqual(self.module.compiled(), ["fib"])
+        self.assertIs(self.module["fib"], self.module["fib"])
+        machine.call("report", 1)
+        self.assertEqual(self.module.compiled(), ["log", "fib", "report"])
+        with self.assertRaises(vm.VMError):
+            machine.call("missing")
+
+    def test_same_as_eager_0(self):
+        self.assertEqual(driver.format_ir(self.module.functions()),
+                         driver.format_ir(driver.compile_source(self.source)))
+
+    def test_errors_0(self):
+        # Errors in a body only show up when it is compiled.
+        module = lazy.Module("function f() -> int { return 1; } function g() -> int { return y; }")
+        self.assertEqual(module.vm().call("f"), 1)
+        with self.assertRaises(ast.SemanticsException):
+            module.load("g")
+        module = lazy.Module("function f() { x := ; }")
+        with self.assertRaises(parser.ParseError):
+            module.load("f")
+
+    def test_order_0(self):
+        # As with eager checking, a function can call a later one.
+        module = lazy.Module("function f() -> int { return g(); } function g() -> int { return 1; }")
+        self.assertEqual(module.vm().call("f"), 1)
+        self.assertEqual(module.compiled(), ["f", "g"])
+
+    def test_bad_structure_0(self):
+        with self.assertRaises(parser.ParseError):
+            lazy.Module("function f() { if(1) { }")
+        with self.assertRaises(parser.ParseFail):
+            lazy.Module("function f() { } }")
+        with self.assertRaises(ast.SemanticsException):
+            lazy.Module("function f() { } function f() { }")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+﻿import unittest
+import sys
+import os
+import io
+import tempfile
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from src import lexer
+
+class LexerTestCase(unittest.TestCase):
+    def assertLexesTo(self, data, expected):
+        tokens = [(x.type, x.data) for x in lexer.lex(data)]
+        self.assertEqual(tokens[:-1], expected)
+        self.assertEqual(tokens[-1][0], lexer.TokenTypes.EOF)
+
+class Test_lexer(LexerTestCase):
+    def test_keyword_0(self):
+        self.assertLexesTo("while whilex", [
+            (lexer.TokenTypes.KEYWORD,    "while"),
+            (lexer.TokenTypes.IDENTIFIER, "whilex")])
+
+    def test_longest_match_0(self):
+        self.assertLexesTo("a<-b<=c<d", [
+            (lexer.TokenTypes.IDENTIFIER, "a"),
+            (lexer.TokenTypes.LARROW,     "<-"),
+            (lexer.TokenTypes.IDENTIFIER, "b"),
+            (lexer.TokenTypes.BINOP,      "<="),
+            (lexer.TokenTypes.IDENTIFIER, "c"),
+            (lexer.TokenTypes.BINOP,      "<"),
+            (lexer.TokenTypes.IDENTIFIER, "d")])
+
+    def test_longest_match_1(self):
+        self.assertLexesTo("x := 10 >= 9", [
+            (lexer.TokenTypes.IDENTIFIER,  "x"),
+            (lexer.TokenTypes.ASSIGN,      ":="),
+            (lexer.TokenTypes.INT_LITERAL, "10"),
+            (lexer.TokenTypes.BINOP,       ">="),
+            (lexer.TokenTypes.INT_LITERAL, "9")])
+
+    def test_line_column_0(self):
+        tokens = list(lexer.lex("a\n\tbc  d\n\ne"))
+        self.assertEqual([(x.line, x.column) for x in tokens], [(1, 1), (2, 2), (2, 6), (4, 1), (4, 2)])
+
+    def test_invalid_0(self):
+        with self.assertRaises(lexer.LexerException):
+            list(lexer.lex("a $ b"))
+
+class Test_lexer_stream(unittest.TestCase):
+    data = "function add(int a, int b) -> int\n{\n\treturn a <= b;\n}\n\n"
+
+    def test_chunk_boundaries_0(self):
+        expected = list(lexer.lex(self.data))
+        for chunk_size in range(1, 8):
+            tokens = list(lexer.lex_stream(io.BytesIO(self.data.encode()), chunk_size))
+            self.assertEqual([tuple(x) for x in tokens], [tuple(x) for x in expected])
+
+    def test_text_stream_0(self):
+        tokens = list(lexer.lex_stream(io.StringIO(self.data), 3))
+        self.assertEqual([tuple(x) for x in tokens], [tuple(x) for x in lexer.lex(self.data)])
+
+    def test_lex_file_0(self):
+        with tempfile.TemporaryDirectory() as path:
+            name = os.path.join(path, "test.x")
+            with open(name, "w") as fp:
+                fp.write(self.data)
+            tokens = list(lexer.lex_file(name))
+        self.assertEqual([tuple(x) for x in tokens], [tuple(x) for x in lexer.lex(self.data)])
+
+    def test_lex_file_empty_0(self):
+        with tempfile.TemporaryDirectory() as path:
+            name = os.path.join(path, "empty.x")
+            open(name, "w").close()
+            tokens = list(lexer.lex_file(name))
+        self.assertEqual([x.type for x in tokens], [lexer.TokenTypes.EOF])
+
+    def test_invalid_0(self):
+        with self.assertRaises(lexer.LexerException):
+            list(lexer.lex_stream(io.BytesIO(b"a : b"), 2))
+
+class Test_token_buffer(unittest.TestCase):
+    data = "function add(int a, int b) -> int\n{\n\treturn a <= b;\n}\n"
+
+    def test_matches_lex_0(self):
+        tokens = lexer.TokenBuffer(self.data)
+        self.assertEqual([tuple(tokens[i]) for i in range(len(tokens))], [tuple(x) for x in lexer.lex(self.data)])
+
+    def test_bytes_0(self):
+        tokens = lexer.TokenBuffer(self.data.encode())
+        self.assertEqual([tuple(tokens[i]) for i in range(len(tokens))], [tuple(x) for x in lexer.lex(self.data)])
+
+    def test_interned_ids_0(self):
+        tokens = lexer.TokenBuffer("return <= x")
+        self.assertEqual(list(tokens.ids), [lexer.token_ids["return"], lexer.token_ids["<="], 0, 0])
+        self.assertEqual(tokens.types[0], lexer.TokenTypes.KEYWORD.value)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+﻿import unittest
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from src import driver
+from src import optimize
+from src import intermediate
+
+def compile_function(body, header="function f() -> int"):
+    return driver.compile_source("{} {{ {} }}".format(header, body))[0]
+
+def lines(function):
+    return [str(x) for x in function.instructions]
+
+class Test_fold_constants(unittest.TestCase):
+    def test_arithmetic_0(self):
+        f = compile_function("decl(int) a := 2 * 3 + 4; decl(int) n := 0 - a; return n / 3 + a % 3;")
+        optimize.fold_constants(f)
+        self.assertEqual(lines(f)[-1], "return -3")
+
+    def test_division_by_zero_0(self):
+        f = compile_function("return 1 / 0;")
+        optimize.fold_constants(f)
+        self.assertEqual(lines(f), ["_t0 <- 1 / 0", "return _t0"])
+
+    def test_branch_0(self):
+        f = compile_function("decl(int) x := 10; if(x < 10) { return 1; } return 2;")
+        optimize.fold_constants(f)
+        jumps = [x for x in f.instructions if isinstance(x, (intermediate.Jmp, intermediate.JmpNotIf))]
+        self.assertIsInstance(jumps[0], intermediate.Jmp)
+        self.assertEqual(jumps[0].label.references, [jumps[0]])
+        self.assertEqual(lines(f)[-1], "return 2")
+
+    def test_branch_removed_0(self):
+        f = compile_function("if(1) { return 1; } return 2;")
+        optimize.fold_constants(f)
+        self.assertFalse(any(isinstance(x, intermediate.JmpNotIf) for x in f.instructions))
+        self.assertEqual(lines(f)[0], "return 1")
+
+    def test_loop_0(self):
+        f = compile_function("decl(int) x := 0; while(x < 10) { x := x + 1; } return x;")
+        optimize.fold_constants(f)
+        self.assertIn("_t0 <- x < 10", lines(f))
+        self.assertEqual(lines(f)[-1], "return x")
+
+    def test_params_0(self):
+        f = compile_function("decl(int) y := 2; return a * y;", "function f(int a) -> int")
+        optimize.fold_constants(f)
+        self.assertEqual(lines(f)[1], "_t0 <- a * 2")
+
+class Test_optimize(unittest.TestCase):
+    def test_coalesce_0(self):
+        f = compile_function("decl(int) s := a * a; s := s + a; return s;", "function f(int a) -> int")
+        report = optimize.optimize_function(f)
+        self.assertEqual(lines(f), ["s <- a * a", "s <- s + a", "return s"])
+        self.assertEqual((report.before, report.after), (5, 3))
+
+    def test_unreachable_0(self):
+        f = compile_function("return a; a := a + 1; return a;", "function f(int a) -> int")
+        optimize.optimize_function(f)
+        self.assertEqual(lines(f), ["return a"])
+
+    def test_labels_0(self):
+        f = compile_function("if(a) { return 1; } else { a := 2; } return a;", "function f(int a) -> int")
+        optimize.optimize_function(f)
+        labels = [x for x in f.instructions if isinstance(x, intermediate.Label)]
+        self.assertTrue(all(x.references for x in labels))
+        self.assertEqual(len(labels), 1)
+
+    def test_reuse_temps_0(self):
+        f = compile_function("return a * b + b * c < a * c + b;", "function f(int a, int b, int c) -> int")
+        optimize.optimize_function(f)
+        temps = {str(x.result) for x in f.instructions if isinstance(x, intermediate.Op)}
+        self.assertEqual(temps, {"_t0", "_t1"})
+
+    def test_loop_0(self):
+        f = compile_function("decl(int) s := 0; decl(int) i := 0; while(i < n) { s := s + i * i; i := i + 1; } return s;",
+            "function f(int n) -> int")
+        optimize.optimize_function(f)
+        self.assertIn("s <- s + _t0", lines(f))
+        self.assertIn("i <- i + 1", lines(f))
+
+    def test_report_0(self):
+        functions = driver.compile_source("function f() {} function g() -> int { decl(int) x := 1; return 2; }")
+        reports = optimize.optimize(functions)
+        self.assertEqual([str(x) for x in reports], ["f: 0 -> 0 instructions", "g: 2 -> 1 instructions"])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+﻿import unittest
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from src import parser
+from src import ast
+
+program = """
+function a(int y) -> int
+{
+    decl(int) x := 10;
+    x := x + y * 2;
+    if(x < 10)
+    {
+        return x;
+    }
+    elif(x > 20)
+    {
+        f(x, y);
+    }
+    while(x < 10)
+    {
+        x := x + 1;
+    }
+    return x;
+}
+"""
+
+class Test_packrat(unittest.TestCase):
+    def test_same_tree_0(self):
+        plain  = parser.parse(program)
+        cached = parser.parse(program, memoize=True)
+        self.assertEqual(len(plain), len(cached))
+        self.assertEqual([type(x) for x in plain[0].statements], [type(x) for x in cached[0].statements])
+        self.assertIsInstance(cached[0].statements[1].rhs, ast.Binop)
+
+    def test_hits_0(self):
+        cache = parser.PackratCache()
+        parser.parse(program, memoize=cache)
+        self.assertGreater(cache.hits, 0)
+        self.assertGreater(cache.misses, 0)
+        self.assertGreater(cache.hit_rate(), 0.0)
+
+    def test_failure_0(self):
+        cache = parser.PackratCache()
+        with self.assertRaises(parser.ParseFail):
+            parser.parse("1 +", parser.expression, memoize=cache)
+
+if __name__ == '__main__':
+    unittest.main()
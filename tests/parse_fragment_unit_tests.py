@@ -56,5 +56,14 @@ class Test_parse_fragment_unit_tests(ParserTestCase):
     def test_if_1(self):
         self.assertParsesTo(parser.if_, "if(x){}elif(x){}else{}", ast.If)
 
+    def test_error_position_0(self):
+        tokens = parser.TokenState("x := 1; if(x { }")
+        self.assertIsInstance(parser.statement(tokens), ast.Assign)
+        pos = tokens.pos
+        with self.assertRaises(parser.ParseError):
+            parser.statement(tokens)
+        self.assertEqual(tokens.pos, pos)
+        self.assertEqual(tokens.depth, 0)
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,77 @@
+﻿import unittest
+import sys
+import os
+import random
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from src import vm
+from src import driver
+from src import optimize
+from src import pybackend
+from tests.binop_eval_test import random_expression
+from tests.vm_test import program, reference_sum
+
+class Test_pybackend(unittest.TestCase):
+    def setUp(self):
+        self.functions = driver.compile_source("function log(int x) {}" + program)
+
+    def test_matches_vm_0(self):
+        for name, args in (("fib", (12,)), ("count", (50,)), ("sum", (300,)), ("sum", (0,))):
+            self.assertEqual(pybackend.run(self.functions, name, *args),
+                             vm.run(self.functions, name, *args))
+
+    def test_loop_0(self):
+        self.assertEqual(pybackend.run(self.functions, "sum", 1000), reference_sum(1000))
+
+    def test_optimized_0(self):
+        optimize.optimize(self.functions)
+        self.assertEqual(pybackend.run(self.functions, "fib", 15), 610)
+        self.assertEqual(pybackend.run(self.functions, "sum", 1000), reference_sum(1000))
+
+    def test_builtins_0(self):
+        out = []
+        functions = [x for x in self.functions if str(x.id) != "log"]
+        module = pybackend.Module(functions, builtins={"log" : out.append})
+        self.assertIsNone(module.call("report", 21))
+        self.assertEqual(out, [42])
+
+    def test_expressions_0(self):
+        random.seed(0)
+        for _ in range(50):
+            expr, result = random_expression(operations=["+", "-", "*", "/", "%"], length=20)
+            functions = driver.compile_source("function f() -> int {{ return {}; }}".format(expr))
+            self.assertEqual(str(pybackend.run(functions, "f")), result)
+
+    def test_blocks_0(self):
+        # The per-block fallback gives the same results as the structured
+        # layout, which is what normally runs.
+        for x in self.functions:
+            self.assertNotIn("def _b", pybackend.generate(x))
+        module = pybackend.Module()
+        for x in self.functions:
+            exec(pybackend.generate(x, structured=False), module.namespace)
+        for name, args in (("fib", (12,)), ("count", (50,)), ("sum", (300,))):
+            self.assertEqual(module.call(name, *args), vm.run(self.functions, name, *args))
+
+    def test_deep_loops_0(self):
+        # Deeper than CPython nests loops, so laid out as blocks.
+        depth = 25
+        body = "n := n + 1;"
+        for i in range(depth):
+            body = "decl(int) i{0} := 0; while(i{0} < 1) {{ i{0} := i{0} + 1; {1} }}".format(i, body)
+        functions = driver.compile_source("function f() -> int {{ decl(int) n := 0; {} return n; }}".format(body))
+        self.assertIn("def _b", pybackend.generate(functions[0]))
+        self.assertEqual(pybackend.run(functions, "f"), 1)
+
+    def test_keywords_0(self):
+        functions = driver.compile_source("""
+function def(int lambda) -> int
+{
+    decl(int) None := lambda * 2;
+    return None;
+}
+""")
+        self.assertEqual(pybackend.run(functions, "def", 4), 8)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,116 @@
+﻿import unittest
+import sys
+import os
+import threading
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from src import parser
+from src import ast
+
+program = """
+function a(int y) -> int
+{
+    decl(int) x := 10;
+    while(x < 10)
+    {
+        decl(int) z := x;
+        x := x + z;
+    }
+    return x + y;
+}
+
+function b()
+{
+    decl(int) x := 1;
+}
+"""
+
+class Test_semantics(unittest.TestCase):
+    def test_check_twice_0(self):
+        tree = parser.parse(program)
+        tree.check_semantics()
+        tree.check_semantics()
+        parser.parse(program).check_semantics()
+
+    def test_context_0(self):
+        context = ast.SemanticContext()
+        parser.parse(program).check_semantics(context)
+        self.assertIn("a", context.table)
+        self.assertIn("b", context.table)
+        with self.assertRaises(ast.SemanticsException):
+            parser.parse(program).check_semantics(context)
+
+    def test_signatures_first_0(self):
+        # Every signature is declared before any body is checked, so a
+        # function can call one defined after it.
+        tree = parser.parse("""
+function a(int x) -> int { return b(x) + 1; }
+function b(int x) -> int { return x; }
+""")
+        tree.check_semantics()
+        with self.assertRaises(ast.SemanticsException):
+            parser.parse("function a() { } function a() { }").check_semantics()
+        with self.assertRaises(ast.SemanticsException):
+            parser.parse("function a() -> int { return b(1, 2); } function b(int x) -> int { return x; }").check_semantics()
+
+    def test_unresolved_pickle_0(self):
+        import pickle
+        error = pickle.loads(pickle.dumps(ast.UnresolvedNames(["x", "y"])))
+        self.assertEqual(error.names, ["x", "y"])
+        self.assertEqual(str(error), "Cannot find variables 'x', 'y'")
+
+    def test_resolutions_0(self):
+        tree = parser.parse(program)
+        context = ast.SemanticContext()
+        tree.check_semantics(context)
+        # _return is slot 0 of a's scope, after its parameter y.
+        self.assertEqual(list(context.table.resolutions[tree[0]]), [
+            ("x", 1, 2),                # decl x
+            ("x", 1, 2),                # x < 10
+            ("x", 1, 2), ("z", 2, 0),   # decl z := x
+            ("x", 1, 2), ("x", 1, 2), ("z", 2, 0),
+            ("x", 1, 2), ("y", 1, 0),
+        ])
+        self.assertEqual(context.table.resolutions[tree[0]].renamed, {})
+
+    def test_shadowing_0(self):
+        from src import driver
+        from src import vm
+        source = """
+function f(int a) -> int
+{
+    if(a > 0)
+    {
+        decl(int) a := 2;
+        a := a + 5;
+    }
+    return a;
+}
+"""
+        self.assertEqual(vm.run(driver.compile_source(source), "f", 1), 1)
+        self.assertEqual(vm.run(driver.compile_source(source, jobs=2), "f", 1), 1)
+
+    def test_return_type_0(self):
+        table = ast.SymbolTable()
+        with self.assertRaises(ast.SemanticsException) as error:
+            parser.parse("function f() -> int { return g(); } function g() { }").check_semantics(table)
+        self.assertNotIsInstance(error.exception, ast.UnresolvedNames)
+        self.assertEqual(table.unresolved, [])
+
+    def test_threads_0(self):
+        errors = []
+        def check():
+            try:
+                for _ in range(20):
+                    parser.parse(program).check_semantics()
+            except Exception as e:
+                errors.append(e)
+        threads = [threading.Thread(target=check) for _ in range(4)]
+        for x in threads:
+            x.start()
+        for x in threads:
+            x.join()
+        self.assertEqual(errors, [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+﻿import unittest
+import sys
+import os
+import io
+import json
+import tempfile
+import threading
+from contextlib import redirect_stderr
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+import compiler
+from src import driver
+from src import parser
+from src import stats
+
+program = """
+function f(int a) -> int
+{
+    decl(int) x := a;
+    while(x < 10)
+    {
+        x := x + f(x);
+    }
+    return x;
+}
+"""
+
+class Test_stats(unittest.TestCase):
+    def test_disabled_0(self):
+        self.assertIsNone(stats.current())
+        with stats.stage("lex"):
+            pass
+        stats.count("tokens")
+        self.assertIsNone(stats.current())
+
+    def test_collect_0(self):
+        with stats.collect() as collected:
+            functions = driver.compile_source(program)
+        self.assertIsNone(stats.current())
+        self.assertEqual(list(collected.times), ["lex", "parse", "check", "lower"])
+        self.assertEqual(collected.counts["tokens"], len(parser.TokenState(program).tokens))
+        self.assertEqual(collected.counts["ir_instructions"], len(functions[0].instructions))
+        self.assertGreater(collected.counts["ast_nodes_check_semantics"], 0)
+        self.assertGreater(collected.counts["symbol_lookups"], 0)
+        # `x := ...` is first tried as a function call and backtracks.
+        self.assertGreater(collected.backtracks["func_call"], 0)
+
+    def test_merge_0(self):
+        a, b = stats.Stats(), stats.Stats()
+        with stats.collect(a):
+            parser.parse(program)
+        with stats.collect(b):
+            parser.parse(program)
+        a.merge(b)
+        self.assertEqual(a.counts["tokens"], 2 * b.counts["tokens"])
+        self.assertEqual(json.loads(a.to_json())["counts"]["tokens"], a.counts["tokens"])
+
+    def test_threads_0(self):
+        # Two compilations running at once each count only their own tokens.
+        sources = [program, program + program.replace("f", "g")]
+        results = [None, None]
+        barrier = threading.Barrier(2, timeout=30)
+        def run(i):
+            with stats.collect() as collected:
+                barrier.wait()
+                try:
+                    driver.compile_source(sources[i])
+                finally:
+                    barrier.wait()
+            results[i] = collected
+        threads = [threading.Thread(target=run, args=(i,)) for i in range(2)]
+        for x in threads:
+            x.start()
+        for x in threads:
+            x.join()
+        self.assertIsNone(stats.current())
+        self.assertEqual(results[1].counts["tokens"], 2 * results[0].counts["tokens"])
+
+    def test_main_0(self):
+        with tempfile.TemporaryDirectory() as dir:
+            path = os.path.join(dir, "f.x")
+            with open(path, "w") as fp:
+                fp.write(program)
+            err = io.StringIO()
+            with redirect_stderr(err):
+                status = compiler.main(["--stats=json", "-o", os.path.join(dir, "out.ir"), path])
+        self.assertEqual(status, 0)
+        out = json.loads(err.getvalue())
+        self.assertEqual(out["files"][path], out["total"])
+        self.assertIn("parse", out["total"]["times"])
+
+if __name__ == '__main__':
+    unittest.main()
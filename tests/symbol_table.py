@@ -18,5 +18,24 @@ class Test_symbol_table(unittest.TestCase):
         table["a"] = 10
         table["a"] = 10
 
+    def test_shadowing(self):
+        table = ast.SymbolTable()
+        table["a"] = 1
+        scope = table.new_scope()
+        scope["b"] = 2
+        scope["a"] = 3
+        self.assertEqual(scope["a"], 3)
+        self.assertEqual(scope.resolve("a"), (1, 1))
+        scope.close()
+        self.assertEqual(table["a"], 1)
+        self.assertEqual(table.resolve("a"), (0, 0))
+        self.assertNotIn("b", table)
+
+    def test_unresolved_batch(self):
+        func = parser.parse("function f() { decl(int) x := y + z; x := w; }", parser.function)
+        with self.assertRaises(ast.UnresolvedNames) as e:
+            func.check_semantics(ast.SymbolTable())
+        self.assertEqual(e.exception.names, ["y", "z", "w"])
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,103 @@
+﻿import unittest
+import sys
+import os
+import random
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from src import ast
+from src import parser
+from src import intermediate
+from src import vectorize
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+def rowwise(instructions, env, result):
+    """ Evaluates the lowered expression one row at a time. """
+    out = []
+    for row in range(len(next(iter(env.values())))):
+        values = dict((k, int(v[row])) for k, v in env.items())
+        get = lambda x: int(x.value) if str(x).isdigit() else values[str(x)]
+        for x in instructions:
+            values[str(x.result)] = intermediate.binops[str(x.op)](get(x.lhs), get(x.rhs))
+        out.append(get(result))
+    return out
+
+class Test_rowwise(unittest.TestCase):
+    """ Checks the row at a time reference that Test_vectorize compares
+    against, so that it runs without numpy. """
+    def rows(self, text):
+        instructions, result = vectorize.lower(parser.parse(text, parser.expression))
+        return rowwise(instructions, {"a" : [-3, 4, 7], "b" : [2, -5, 7]}, result)
+
+    def test_arithmetic_0(self):
+        self.assertEqual(self.rows("a * 3 + b - 1"), [-8, 6, 27])
+
+    def test_floor_0(self):
+        self.assertEqual(self.rows("a / b"), [-2, -1, 1])
+        self.assertEqual(self.rows("a % b"), [1, -1, 0])
+
+    def test_comparison_0(self):
+        self.assertEqual(self.rows("a < b == a >= 0"), [0, 0, 0])
+        self.assertEqual(self.rows("a <= b"), [1, 0, 1])
+
+@unittest.skipIf(numpy is None, "numpy is not installed")
+class Test_vectorize(unittest.TestCase):
+    def setUp(self):
+        random.seed(0)
+        self.env = {
+            "a" : numpy.arange(-50, 50, dtype=numpy.int64),
+            "b" : numpy.array([random.choice([-7, -3, 2, 5, 9]) for _ in range(100)]),
+        }
+
+    def assertMatchesRows(self, text):
+        node = parser.parse(text, parser.expression)
+        instructions, result = vectorize.lower(node)
+        expected = rowwise(instructions, self.env, result)
+        out = vectorize.evaluate(node, self.env)
+        self.assertEqual([int(x) for x in out], expected)
+        return out
+
+    def test_arithmetic_0(self):
+        self.assertMatchesRows("a * 3 + b - 1")
+
+    def test_floor_0(self):
+        self.assertMatchesRows("a / b")
+        self.assertMatchesRows("a % b")
+
+    def test_comparison_0(self):
+        out = self.assertMatchesRows("a < b")
+        self.assertEqual(out.dtype, numpy.bool_)
+
+    def test_mixed_0(self):
+        self.assertMatchesRows("a < b == a >= 0")
+        self.assertMatchesRows("a * b % 4 != b - a / 3")
+
+    def test_boolean_arithmetic_0(self):
+        # A comparison feeding arithmetic counts as 1 or 0, so true + true
+        # is 2 rather than NumPy's logical or.
+        t0, t1 = ast.Identifier("_t0"), ast.Identifier("_t1")
+        instructions = [
+            intermediate.Op(t0, ast.Operation("<"), ast.Identifier("a"), ast.Identifier("b")),
+            intermediate.Op(t1, ast.Operation("+"), t0, t0),
+        ]
+        out = vectorize.evaluate(instructions, self.env)
+        self.assertEqual([int(x) for x in out], rowwise(instructions, self.env, t1))
+
+    def test_instructions_0(self):
+        instructions, result = vectorize.lower(parser.parse("a * 2 <= b", parser.expression))
+        out = vectorize.evaluate(instructions, self.env)
+        self.assertTrue(numpy.array_equal(out, self.env["a"] * 2 <= self.env["b"]))
+
+    def test_division_by_zero_0(self):
+        with self.assertRaises(ZeroDivisionError):
+            vectorize.evaluate(parser.parse("b / a", parser.expression), self.env)
+
+    def test_unbound_0(self):
+        with self.assertRaises(NameError):
+            vectorize.evaluate(parser.parse("a + c", parser.expression), self.env)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+﻿import unittest
+import sys
+import os
+import random
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from src import vm
+from src import driver
+from src import optimize
+from tests.binop_eval_test import random_expression
+
+program = """
+function fib(int n) -> int
+{
+    if(n < 2)
+    {
+        return n;
+    }
+    return fib(n - 1) + fib(n - 2);
+}
+
+function count(int n) -> int
+{
+    if(n == 0)
+    {
+        return 0;
+    }
+    return count(n - 1) + 1;
+}
+
+function sum(int n) -> int
+{
+    decl(int) s := 0;
+    decl(int) i := 0;
+    while(i < n)
+    {
+        if(i % 3 == 0)
+        {
+            s := s + i;
+        }
+        elif(i % 3 == 1)
+        {
+            s := s - 1;
+        }
+        else
+        {
+            s := s * 2 / 3;
+        }
+        i := i + 1;
+    }
+    return s;
+}
+
+function report(int x)
+{
+    log(x * 2);
+}
+"""
+
+def reference_sum(n):
+    s = 0
+    for i in range(n):
+        if i % 3 == 0:
+            s += i
+        elif i % 3 == 1:
+            s -= 1
+        else:
+            s = s * 2 // 3
+    return s
+
+class Test_vm(unittest.TestCase):
+    def setUp(self):
+        self.functions = driver.compile_source("function log(int x) {}" + program)
+
+    def test_fib_0(self):
+        self.assertEqual(vm.run(self.functions, "fib", 15), 610)
+
+    def test_loop_0(self):
+        self.assertEqual(vm.run(self.functions, "sum", 1000), reference_sum(1000))
+
+    def test_deep_calls_0(self):
+        self.assertEqual(vm.run(self.functions, "count", 20000), 20000)
+
+    def test_optimized_0(self):
+        optimize.optimize(self.functions)
+        self.assertEqual(vm.run(self.functions, "fib", 15), 610)
+        self.assertEqual(vm.run(self.functions, "sum", 1000), reference_sum(1000))
+
+    def test_builtins_0(self):
+        out = []
+        machine = vm.VM(self.functions, builtins={"log" : out.append})
+        del machine.codes["log"]
+        self.assertIsNone(machine.call("report", 21))
+        self.assertEqual(out, [42])
+
+    def test_arguments_0(self):
+        with self.assertRaises(vm.VMError):
+            vm.run(self.functions, "fib")
+
+    def test_expressions_0(self):
+        random.seed(0)
+        for _ in range(50):
+            expr, result = random_expression(operations=["+", "-", "*", "/", "%"], length=20)
+            functions = driver.compile_source("function f() -> int {{ return {}; }}".format(expr))
+            self.assertEqual(str(vm.run(functions, "f")), result)
+
+if __name__ == '__main__':
+    unittest.main()